@@ -0,0 +1,243 @@
+"""
+Benchmark masked endpoints against a synthetic dataset
+
+    python -m benchmarks.run --tickets 500 --output results.json
+    python -m benchmarks.run --compare results.json
+
+For each view and mask, records wall time over `--repeat` requests, the
+number of queries and of rows they return, model instances created, peak
+memory traced by `tracemalloc` and the response size. Results are written
+as JSON; `--compare` prints each measurement relative to an earlier run.
+
+Needs Python 3 and Django 2.0 or later.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+
+import django
+import factory.random
+import rest_framework
+from django.db import connection
+from django.db.models.signals import post_init
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+MASKS = [
+    ('none', ''),
+    ('shallow', 'fields=title'),
+    ('deep', 'fields=title,author/username,comments(body,author/username)'),
+    ('excludes', 'excludes=body,comments/author'),
+]
+
+RAW_MASKS = [
+    ('none', ''),
+    ('shallow', 'fields=a'),
+    ('deep', 'fields=d/a/c'),
+    ('excludes', 'excludes=b,d/a/d'),
+]
+
+VIEWS = [
+    ('TicketViewSet', 'ticket-list', MASKS),
+    ('InferredTicketViewSet', 'inferred-ticket-list', MASKS),
+    ('RawViewSet', 'raw-data', RAW_MASKS),
+]
+
+
+def create_dataset(tickets, comments, users, seed):
+    """
+    Tickets and comments are inserted in bulk; authors are drawn from a
+    small pool of users, as they would be in practice
+    """
+    from tests import factories
+    from tests.models import Comment, Ticket
+
+    random.seed(seed)
+    factory.random.reseed_random(seed)
+
+    authors = factories.UserFactory.create_batch(users)
+    Ticket.objects.bulk_create([
+        factories.TicketFactory.build(author=random.choice(authors))
+        for _ in range(tickets)
+    ])
+    Comment.objects.bulk_create([
+        factories.CommentFactory.build(ticket=ticket, author=random.choice(authors))
+        for ticket in Ticket.objects.all()
+        for _ in range(comments)
+    ])
+
+
+class QueryRecorder(object):
+    """
+    Records the queries run while in use, for `count_rows` to count the
+    rows they return afterwards
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params, many,))
+        return execute(sql, params, many, context)
+
+    def count_rows(self):
+        rows = 0
+        with connection.cursor() as cursor:
+            for sql, params, many in self.queries:
+                if many or not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute('SELECT COUNT(*) FROM (%s) AS counted' % sql, params)
+                rows += cursor.fetchone()[0]
+        return rows
+
+
+class InstanceCounter(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, **kwargs):
+        self.count += 1
+
+
+def measure(client, url, repeat):
+    """
+    :returns:   dict    Measurements for GETting `url`
+    """
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError('%s returned %s' % (url, response.status_code))
+
+    timings = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        client.get(url)
+        timings.append(timeit.default_timer() - start)
+    timings.sort()
+
+    recorder, counter = QueryRecorder(), InstanceCounter()
+    post_init.connect(counter)
+    try:
+        with connection.execute_wrapper(recorder):
+            response = client.get(url)
+    finally:
+        post_init.disconnect(counter)
+
+    tracemalloc.start()
+    try:
+        client.get(url)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'time_min_ms': round(timings[0] * 1000, 3),
+        'time_median_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'queries': len(recorder.queries),
+        'rows': recorder.count_rows(),
+        'instances': counter.count,
+        'peak_memory_kib': peak_memory // 1024,
+        'response_bytes': len(response.content),
+    }
+
+
+def run(options):
+    client = Client()
+    results = []
+    for view_name, url_name, masks in VIEWS:
+        for mask_name, query in masks:
+            url = reverse(url_name) + ('?' + query if query else '')
+            result = {'view': view_name, 'mask': mask_name, 'query': query}
+            result.update(measure(client, url, options.repeat))
+            results.append(result)
+            print('%-24s %-9s %9.2fms %4d queries' % (
+                view_name, mask_name, result['time_median_ms'], result['queries'],
+            ), file=sys.stderr)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'djangorestframework': rest_framework.VERSION,
+            'database': connection.vendor,
+        },
+        'dataset': {
+            'tickets': options.tickets,
+            'comments_per_ticket': options.comments,
+            'users': options.users,
+            'seed': options.seed,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    """
+    :returns:   list    Of lines, one per result, with each measurement as
+                        a ratio of the one in `baseline`
+    """
+    previous = dict(
+        ((result['view'], result['mask']), result)
+        for result in baseline['results']
+    )
+    keys = ('time_median_ms', 'queries', 'rows', 'instances', 'peak_memory_kib')
+    lines = ['%-24s %-9s ' % ('view', 'mask') + ' '.join('%16s' % key for key in keys)]
+    for result in report['results']:
+        before = previous.get((result['view'], result['mask']))
+        if before is None:
+            continue
+        ratios = [
+            '%16s' % ('%.2fx' % (float(result[key]) / before[key]) if before[key] else '-')
+            for key in keys
+        ]
+        lines.append('%-24s %-9s ' % (result['view'], result['mask']) + ' '.join(ratios))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=200)
+    parser.add_argument('--comments', type=int, default=5, help='comments per ticket')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=10, help='timed requests per view and mask')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results here instead of to stdout')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    options = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    django.setup()
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        create_dataset(options.tickets, options.comments, options.users, options.seed)
+        report = run(options)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        with io.open(options.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if options.compare:
+        with io.open(options.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print('\n'.join(compare(report, baseline)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+from __future__ import unicode_literals
+
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'maxsize', 'currsize',))
+
+
+class LRUCache(object):
+    """
+    Small, thread-safe, least-recently-used mapping
+
+    :maxsize:   int     Maximum number of entries to retain. `None` means
+                        unbounded, and `0` disables storage entirely
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(setting_name, default_maxsize):
+    """
+    :setting_name:      str     Django setting holding the cache's size
+
+    :returns:           LRUCache    Process-wide cache, recreated whenever
+                                    its setting changes
+    """
+    cache = _caches.get(setting_name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(setting_name)
+            if cache is None:
+                cache = _caches[setting_name] = LRUCache(
+                    maxsize=getattr(settings, setting_name, default_maxsize),
+                )
+    return cache
+
+
+def reset_cache(*args, **kwargs):
+    _caches.pop(kwargs.get('setting'), None)
+
+
+setting_changed.connect(reset_cache)
@@ -0,0 +1,181 @@
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.query_utils import DeferredAttribute
+from django.utils import six
+from rest_framework.fields import (
+    CharField, Field, IntegerField, SkipField, empty,
+)
+from rest_framework.relations import PKOnlyObject
+
+from . import constants
+from .cache import get_cache
+
+# How a field's value is read and represented by generated code
+DELEGATE = 'delegate'  # field.get_attribute() / field.to_representation()
+TEXT = 'text'          # instance.<attname>, six.text_type()
+INTEGER = 'integer'    # instance.<attname>, int()
+VALUE = 'value'        # instance.<attname>, field.to_representation()
+
+
+def is_inherited(field, method_name, base):
+    return (
+        six.get_unbound_function(getattr(type(field), method_name)) is
+        six.get_unbound_function(getattr(base, method_name))
+    )
+
+
+def get_column_attname(model, field):
+    """
+    :returns:   str     Attribute holding the concrete, non-relational model
+                        column `field` reads, or None
+    """
+    if len(field.source_attrs) != 1:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if model_field.is_relation or not model_field.concrete:
+        return None
+    return model_field.attname
+
+
+def has_plain_descriptor(model, attname):
+    """
+    :returns:   bool    True if instances of `model` hold the value loaded
+                        for `attname` as it is, so that `QuerySet.values()`
+                        returns the same value. Fields with descriptors of
+                        their own, like `FileField`, wrap it
+    """
+    return type(getattr(model, attname, None)) is DeferredAttribute
+
+
+def get_field_strategy(model, field):
+    """
+    :returns:   tuple   (strategy, attname,) for one readable field
+    """
+    if not is_inherited(field, 'get_attribute', Field) or field.default is not empty:
+        return DELEGATE, None
+
+    attname = get_column_attname(model, field)
+    if attname is None:
+        return DELEGATE, None
+
+    if is_inherited(field, 'to_representation', CharField) and isinstance(field, CharField):
+        return TEXT, attname
+    if is_inherited(field, 'to_representation', IntegerField) and isinstance(field, IntegerField):
+        return INTEGER, attname
+    return VALUE, attname
+
+
+def get_representation_signature(model, fields):
+    return tuple(
+        (field.field_name,) + get_field_strategy(model, field)
+        for field in fields
+    )
+
+
+def generate_representation_source(signature, from_values=False):
+    """
+    :signature:     tuple   As returned by `get_representation_signature`
+    :from_values:   bool    Generate code for the dicts returned by
+                            `QuerySet.values()` instead of model instances.
+                            `signature` may not contain DELEGATE fields
+
+    :returns:       str     Source of `to_representation(instance, fields)`,
+                            an unrolled equivalent of DRF's
+                            `Serializer.to_representation` loop
+    """
+    lines = [
+        'def to_representation(instance, fields):',
+        '    ret = OrderedDict()',
+    ]
+    for index, (field_name, strategy, attname) in enumerate(signature):
+        key = repr(field_name)
+        if strategy == DELEGATE:
+            lines.extend([
+                '    field = fields[%d]' % index,
+                '    try:',
+                '        attribute = field.get_attribute(instance)',
+                '    except SkipField:',
+                '        pass',
+                '    else:',
+                '        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute',
+                '        ret[%s] = None if check_for_none is None else field.to_representation(attribute)' % key,
+            ])
+            continue
+
+        if strategy == TEXT:
+            represent = 'text_type(value)'
+        elif strategy == INTEGER:
+            represent = 'int(value)'
+        else:
+            represent = 'fields[%d].to_representation(value)' % index
+        lines.extend([
+            ('    value = instance[%r]' if from_values else '    value = instance.%s') % attname,
+            '    ret[%s] = None if value is None else %s' % (key, represent,),
+        ])
+
+    lines.append('    return ret')
+    return '\n'.join(lines) + '\n'
+
+
+def compile_representation(signature, name='to_representation', from_values=False):
+    namespace = {
+        'OrderedDict': OrderedDict,
+        'PKOnlyObject': PKOnlyObject,
+        'SkipField': SkipField,
+        'text_type': six.text_type,
+    }
+    code = compile(generate_representation_source(signature, from_values), '<jsonmask %s>' % name, 'exec')
+    six.exec_(code, namespace)
+    return namespace['to_representation']
+
+
+def get_representation_function(serializer_class, model, fields):
+    """
+    :fields:    list        A serializer's readable, already masked, fields
+
+    :returns:   function    `to_representation(instance, fields)`, shared by
+                            every serializer whose fields have the same
+                            signature
+    """
+    signature = get_representation_signature(model, fields)
+    cache = get_cache('REST_FRAMEWORK_JSONMASK_REPRESENTATION_CACHE_SIZE', constants.REPRESENTATION_CACHE_SIZE)
+    key = (serializer_class, model, signature)
+    function = cache.get(key)
+    if function is None:
+        function = compile_representation(signature, serializer_class.__name__)
+        cache.set(key, function)
+    return function
+
+
+def get_values_function(serializer_class, model, fields):
+    """
+    :fields:    list    A serializer's readable, already masked, fields
+
+    :returns:   tuple   (`to_representation(row, fields)` for rows returned
+                        by `QuerySet.values(*columns)`, columns,) or
+                        (None, None) if any field needs a model instance
+    """
+    signature = get_representation_signature(model, fields)
+    if not signature or any(strategy == DELEGATE for _, strategy, _ in signature):
+        return None, None
+    if not all(has_plain_descriptor(model, attname) for _, _, attname in signature):
+        return None, None
+
+    cache = get_cache('REST_FRAMEWORK_JSONMASK_REPRESENTATION_CACHE_SIZE', constants.REPRESENTATION_CACHE_SIZE)
+    key = (serializer_class, model, signature, 'values')
+    function = cache.get(key)
+    if function is None:
+        function = compile_representation(signature, serializer_class.__name__, from_values=True)
+        cache.set(key, function)
+
+    columns = []
+    for _, _, attname in signature:
+        if attname not in columns:
+            columns.append(attname)
+    return function, columns
@@ -2,3 +2,24 @@ from __future__ import unicode_literals
 
 EXCLUDES_NAME = 'excludes'
 FIELDS_NAME = 'fields'
+
+MASK_CACHE_SIZE = 256
+
+PLAN_CACHE_SIZE = 128
+
+PRESET_PREFIX = '@'
+
+MAX_MASK_LENGTH = 2048
+MAX_MASK_DEPTH = 16
+MAX_MASK_NODES = 256
+MAX_MASK_PREDICATES = None
+
+MASKER_CACHE_SIZE = 128
+
+FIELD_PLAN_CACHE_SIZE = 256
+
+REPRESENTATION_CACHE_SIZE = 128
+
+MEMO_SIZE = 1024
+
+RESPONSE_CACHE_PREFIX = 'jsonmask'
@@ -0,0 +1,104 @@
+from __future__ import unicode_literals
+
+import sys
+import warnings
+from collections import OrderedDict
+
+from rest_framework.fields import Field, SerializerMethodField
+
+# Values of `REST_FRAMEWORK_JSONMASK_LAZY_LOADS`
+WARN = 'warn'
+RAISE = 'raise'
+
+
+class LazyLoadWarning(UserWarning):
+    pass
+
+
+class LazyLoadError(Exception):
+    pass
+
+
+def get_serializer_path(frame):
+    """
+    :frame:     frame   Innermost frame to walk outwards from
+
+    :returns:   list    Fields being represented, outermost first, going by
+                        the `field` variable of each `to_representation`
+                        loop on the stack
+    """
+    path = []
+    while frame is not None:
+        if frame.f_code.co_name == 'to_representation':
+            field = frame.f_locals.get('field')
+            if isinstance(field, Field):
+                path.append(field)
+        frame = frame.f_back
+    path.reverse()
+    return path
+
+
+class LazyLoadDetector(object):
+    """
+    Database execute wrapper recording the queries run while serializers
+    represent each field, i.e. relations and other data loaded lazily, one
+    instance at a time
+
+    :lazy_loads:    OrderedDict     Field names path -> [innermost field,
+                                    [SQL, ...]]
+    """
+
+    def __init__(self):
+        self.lazy_loads = OrderedDict()
+
+    def __call__(self, execute, sql, params, many, context):
+        path = get_serializer_path(sys._getframe(1))
+        if path:
+            key = tuple(field.field_name for field in path)
+            self.lazy_loads.setdefault(key, [path[-1], []])[1].append(sql)
+        return execute(sql, params, many, context)
+
+    def get_messages(self, view):
+        """
+        :view:      OptimizedQuerySetMixin  The view that ran the queries
+
+        :returns:   list    One message per field path loaded lazily, naming
+                            the data predicate that should have loaded it
+        """
+        requested_fields, excluded_fields = view.requested_fields, view.excluded_fields
+        applied = dict(
+            (predicate, data_function)
+            for data_function in view.get_data_functions(requested_fields, excluded_fields)
+            for predicate in getattr(data_function, '_data_function_predicates', ())
+        )
+
+        messages = []
+        for key, (field, queries) in self.lazy_loads.items():
+            mask_path, predicate = '/'.join(key), '.'.join(key)
+            message = '%s: `%s` was loaded lazily, by %d %s while serializing (first: %s). ' % (
+                view.__class__.__name__, mask_path, len(queries),
+                'query' if len(queries) == 1 else 'queries', queries[0],
+            )
+            if predicate in applied:
+                message += 'The data predicate `%s` for `%s` was applied, but did not load it.' % (
+                    applied[predicate].__name__, predicate,
+                )
+            elif isinstance(field, SerializerMethodField):
+                message += 'Declare what `%s` reads with `@data_dependencies`, or add `@data_predicate(%r)`.' % (
+                    field.method_name, str(predicate),
+                )
+            else:
+                message += 'No data predicate covers `%s`; add `@data_predicate(%r)`.' % (
+                    predicate, str(predicate),
+                )
+            messages.append(message)
+        return messages
+
+    def report(self, view, mode):
+        messages = self.get_messages(view) if self.lazy_loads else []
+        if not messages:
+            return
+        if mode == RAISE:
+            raise LazyLoadError('\n'.join(messages))
+        for message in messages:
+            warnings.warn(message, LazyLoadWarning)
@@ -14,3 +14,42 @@ def data_predicate(*field_names):
         return inner
 
     return _data_predicate
+
+
+def data_annotation(field_name):
+    """
+    Declares a method returning a query expression (an aggregate,
+    `Subquery`, ...) which is annotated onto the queryset as `field_name`,
+    only when the mask requests that field
+    """
+    def _data_annotation(fnc):
+        fnc._data_annotation_field_name = field_name
+
+        @wraps(fnc)
+        def inner(self):
+            return fnc(self)
+
+        return inner
+
+    return _data_annotation
+
+
+def data_dependencies(*lookups):
+    """
+    Declares the ORM paths (e.g. `comments__author`, `title`) that a
+    serializer's `get_<field_name>` method reads for its `SerializerMethodField`
+
+    Related paths are loaded by `OptimizedQuerySetMixin` only when the field
+    survives the mask, and the declared columns are taken to be the only
+    ones the method reads.
+    """
+    def _data_dependencies(fnc):
+        fnc._data_dependencies = lookups
+
+        @wraps(fnc)
+        def inner(self, obj):
+            return fnc(self, obj)
+
+        return inner
+
+    return _data_dependencies
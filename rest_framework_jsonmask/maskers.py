@@ -0,0 +1,178 @@
+from __future__ import unicode_literals
+
+from django.utils import six
+from jsonmask import should_include_variable
+from jsonmask.mask import is_structure_wildcard
+
+from . import constants
+from .cache import get_cache
+from .utils import FrozenMask
+
+
+class CompiledMask(object):
+    """
+    Callable equivalent of `jsonmask.apply_json_mask` for one fixed mask
+
+    Every inclusion decision `should_include_variable` would make at this
+    level of the mask is worked out once, up front, so applying the mask
+    is a dict lookup per key instead of a walk of the mask per key.
+
+    :mask:          dict    Parsed mask
+    :is_negated:    bool    True if `mask` came from `?excludes=`
+    """
+
+    __slots__ = ('mask', 'is_negated', 'decisions', 'default', 'children',)
+
+    def __init__(self, mask, is_negated=False):
+        self.mask = mask
+        self.is_negated = is_negated
+        self.children = dict(
+            (key, CompiledMask(value, is_negated))
+            for key, value in mask.items()
+            if value
+        )
+
+        if not mask:
+            self.default, decisions = True, {}
+        elif not is_negated:
+            self.default = is_structure_wildcard(mask)
+            decisions = dict((key, True) for key in mask)
+        elif is_structure_wildcard(mask):
+            self.default = self.is_kept_by_excludes(mask['*'])
+            decisions = {}
+        else:
+            self.default = True
+            decisions = dict((key, self.is_kept_by_excludes(value)) for key, value in mask.items())
+
+        # Dotted keys are split into paths by `should_include_variable`, so
+        # they never match a mask key as-is; see `includes`
+        self.decisions = dict(
+            (key, decision) for key, decision in decisions.items() if '.' not in key
+        )
+
+    @staticmethod
+    def is_kept_by_excludes(value):
+        # `?excludes=a(b)` removes `a.b`, not `a`
+        return bool(value) and not is_structure_wildcard(value)
+
+    def includes(self, key):
+        decision = self.decisions.get(key)
+        if decision is not None:
+            return decision
+        if not isinstance(key, six.string_types) or '.' in key:
+            return should_include_variable(key, self.mask, is_negated=self.is_negated)
+        return self.default
+
+    def __call__(self, data, in_place=False):
+        """
+        :data:      dict    Data to prune
+        :in_place:  bool    Prune `data` and the dicts nested in it
+                            directly, instead of building new ones. Only
+                            use for data built for this response alone
+
+        :returns:   dict
+        """
+        if in_place:
+            for key in [key for key in data if not self.includes(key)]:
+                del data[key]
+            for key, child in self.children.items():
+                value = data.get(key)
+                if isinstance(value, dict):
+                    child(value, in_place=True)
+            return data
+
+        children = self.children
+        masked = {}
+        for key, value in data.items():
+            if not self.includes(key):
+                continue
+            if isinstance(value, dict) and key in children:
+                value = children[key](value)
+            masked[key] = value
+        return masked
+
+    def iter_rows(self, rows, in_place=False):
+        """
+        Mask an iterable of same-shaped dicts, e.g. search hits. Which keys
+        survive is worked out once, from the first row (and likewise for
+        nested dicts); rows with different keys are masked one by one, as
+        by `__call__`
+
+        :rows:      iterable    Of dicts
+        :in_place:  bool        As for `__call__`
+
+        :returns:   generator   Of masked rows, produced as `rows` is consumed
+        """
+        shape = None
+        for row in rows:
+            if shape is None:
+                shape = RowShape(self, row, in_place)
+            yield shape.apply(row)
+
+
+class RowShape(object):
+    """
+    What a `CompiledMask` keeps of dicts with one particular set of keys
+    """
+
+    __slots__ = ('masker', 'keys', 'kept', 'dropped', 'nested', 'in_place',)
+
+    def __init__(self, masker, row, in_place=False):
+        self.masker = masker
+        self.keys = frozenset(row)
+        self.kept = [key for key in row if masker.includes(key)]
+        self.dropped = list(self.keys.difference(self.kept))
+        # [key, CompiledMask, RowShape or None until a nested dict is seen]
+        self.nested = [
+            [key, masker.children[key], None]
+            for key in self.kept
+            if key in masker.children
+        ]
+        self.in_place = in_place
+
+    def apply(self, row):
+        if six.viewkeys(row) != self.keys:
+            return self.masker(row, in_place=self.in_place)
+
+        if self.in_place:
+            for key in self.dropped:
+                del row[key]
+            masked = row
+        else:
+            masked = {key: row[key] for key in self.kept}
+
+        for entry in self.nested:
+            value = masked[entry[0]]
+            if isinstance(value, dict):
+                if entry[2] is None:
+                    entry[2] = RowShape(entry[1], value, self.in_place)
+                masked[entry[0]] = entry[2].apply(value)
+        return masked
+
+
+def get_masker_cache():
+    """
+    :returns:   LRUCache    Process-wide cache of `CompiledMask`s, keyed by
+                            mask fingerprint
+    """
+    return get_cache('REST_FRAMEWORK_JSONMASK_MASKER_CACHE_SIZE', constants.MASKER_CACHE_SIZE)
+
+
+def compile_mask(mask, is_negated=False):
+    """
+    :mask:          dict            Parsed mask
+    :is_negated:    bool            True if `mask` came from `?excludes=`
+
+    :returns:       CompiledMask    Shared between all callers using an
+                                    equal mask
+    """
+    if not isinstance(mask, FrozenMask):
+        mask = FrozenMask(mask)
+
+    cache = get_masker_cache()
+    key = (mask.fingerprint, is_negated)
+    masker = cache.get(key)
+    if masker is None:
+        masker = CompiledMask(mask, is_negated)
+        cache.set(key, masker)
+    return masker
@@ -0,0 +1,754 @@
+from __future__ import unicode_literals
+
+from functools import wraps
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.fields.related import ForeignObjectRel
+from jsonmask import should_include_variable
+from jsonmask.mask import is_structure_wildcard
+from rest_framework.serializers import (
+    BaseSerializer, ListSerializer, SerializerMethodField,
+)
+
+
+def get_serializer_fields(serializer):
+    """
+    :serializer:    Serializer  Possibly a `many=True` ListSerializer
+
+    :returns:       list        Every readable field, ignoring any mask
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    if hasattr(serializer, 'get_all_fields'):
+        # `FieldsListSerializerMixin` only builds the fields its mask keeps
+        fields = serializer.get_all_fields()
+    else:
+        fields = serializer.fields
+    return [field for field in fields.values() if not field.write_only]
+
+
+def get_nested_serializer(field):
+    """
+    :returns:   Serializer      The serializer a field delegates to, or None
+    """
+    if isinstance(field, ListSerializer):
+        return field.child
+    if isinstance(field, BaseSerializer):
+        return field
+    return None
+
+
+def get_data_dependencies(field):
+    """
+    :returns:   tuple   ORM paths declared with `@data_dependencies` on a
+                        `SerializerMethodField`'s method, or None
+    """
+    if not isinstance(field, SerializerMethodField):
+        return None
+    method = getattr(field.parent, field.method_name, None)
+    return getattr(method, '_data_dependencies', None)
+
+
+def resolve_relation_path(model, path):
+    """
+    :path:      str     ORM path like `comments__author__username`
+
+    :returns:   tuple   (str, bool,) of the leading part of `path` that
+                        traverses relations (`comments__author`), and whether
+                        every traversed relation is single-valued
+    """
+    relations = []
+    is_single = True
+    for part in path.split('__'):
+        model_field = get_model_field(model, part)
+        if model_field is None or not model_field.is_relation or model_field.related_model is None:
+            break
+        relations.append(part)
+        is_single = is_single and (model_field.many_to_one or model_field.one_to_one)
+        model = model_field.related_model
+    return '__'.join(relations), is_single
+
+
+def get_model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        pass
+
+    # Reverse relations without a `related_name` are reached via `foo_set`
+    for related_object in model._meta.related_objects:
+        if related_object.get_accessor_name() == name:
+            return related_object
+    return None
+
+
+def minimize_lookups(lookups):
+    """
+    Drop duplicate lookups and those implied by a longer lookup,
+    e.g. `comments` is implied by `comments__author`
+
+    :lookups:   list    ORM lookup strings, in application order
+
+    :returns:   list
+    """
+    minimized = []
+    for lookup in lookups:
+        if lookup in minimized:
+            continue
+        if any(other.startswith(lookup + '__') for other in lookups):
+            continue
+        minimized.append(lookup)
+    return minimized
+
+
+def get_sub_structure(structure, field_name):
+    # Mirrors how `FieldsListSerializerMixin` hands masks to nested serializers
+    return (structure or {}).get(field_name) or {}
+
+
+def get_lookup_path(lookup):
+    return lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup
+
+
+def get_prefetched_paths(queryset):
+    """
+    :returns:   set     Paths the queryset's prefetch lookups already
+                        prefetch into, including those they traverse
+    """
+    paths = set()
+    for lookup in queryset._prefetch_related_lookups:
+        parts = (lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup).split('__')
+        for index in range(1, len(parts) + 1):
+            paths.add('__'.join(parts[:index]))
+    return paths
+
+
+def normalize_prefetch_lookups(queryset):
+    """
+    Dedupe the queryset's prefetch lookups, drop plain lookups implied by
+    longer ones, and order them shallowest first so that `Prefetch` objects
+    are always seen before the lookups that traverse them.
+
+    Of two lookups prefetching into the same path, the one added first is
+    kept, since Django refuses a `Prefetch` with a queryset for a path
+    already prefetched.
+    """
+    lookups = list(queryset._prefetch_related_lookups)
+    if len(lookups) < 2:
+        return queryset
+
+    paths = [get_lookup_path(lookup) for lookup in lookups]
+    normalized = []
+    prefetched_to = set()
+    for lookup in lookups:
+        if isinstance(lookup, Prefetch):
+            if lookup.prefetch_to in prefetched_to:
+                continue
+            prefetched_to.add(lookup.prefetch_to)
+            normalized.append(lookup)
+            continue
+        if lookup in prefetched_to:
+            continue
+        prefetched_to.add(lookup)
+        if any(path.startswith(lookup + '__') for path in paths):
+            continue
+        normalized.append(lookup)
+
+    normalized.sort(key=lambda lookup: get_lookup_path(lookup).count('__'))
+
+    if normalized == lookups:
+        return queryset
+    return queryset.prefetch_related(None).prefetch_related(*normalized)
+
+
+def make_annotation_function(field_name, annotation_function):
+    """
+    :returns:   function    A data function annotating the result of
+                            `annotation_function` as `field_name`
+    """
+    @wraps(annotation_function)
+    def data_function(self, queryset):
+        return queryset.annotate(**{field_name: annotation_function(self)})
+
+    return data_function
+
+
+class PredicateTrie(object):
+    """
+    Data predicates arranged by their dotted path, so that matching them
+    against a mask takes a single walk of the mask rather than one
+    `should_include_variable` call per predicate.
+
+    Matches are returned parents first, siblings in alphabetical order,
+    and each function at most once.
+    """
+
+    __slots__ = ('children', 'functions',)
+
+    def __init__(self):
+        self.children = {}
+        self.functions = []
+
+    @classmethod
+    def build(cls, data_predicates, data_annotations=None):
+        trie = cls()
+        for dotted_path, data_function in data_predicates.items():
+            trie.insert(dotted_path, data_function)
+        for field_name, annotation_function in (data_annotations or {}).items():
+            trie.insert(field_name, make_annotation_function(field_name, annotation_function))
+        for node in trie.iter_nodes():
+            node.functions.sort(key=lambda data_function: data_function.__name__)
+        return trie
+
+    def insert(self, dotted_path, data_function):
+        node = self
+        for key in dotted_path.split('.'):
+            node = node.children.setdefault(key, self.__class__())
+        node.functions.append(data_function)
+
+    def iter_nodes(self):
+        yield self
+        for key in sorted(self.children):
+            for node in self.children[key].iter_nodes():
+                yield node
+
+    def all(self):
+        return self._dedupe(
+            data_function
+            for node in self.iter_nodes()
+            for data_function in node.functions
+        )
+
+    def match(self, structure, is_negated=False):
+        """
+        :structure:     dict    Parsed mask
+        :is_negated:    bool    True if `structure` came from `?excludes=`
+
+        :returns:       list    Data functions whose path the mask includes,
+                                with the same semantics as
+                                `jsonmask.should_include_variable`
+        """
+        if not structure:
+            return self.all()
+        if is_negated:
+            return self._dedupe(self._match_excludes(structure))
+        return self._dedupe(self._match_fields(structure))
+
+    def _match_fields(self, structure):
+        for key in sorted(self.children):
+            child = self.children[key]
+            if not structure:
+                sub_structure = {}
+            elif is_structure_wildcard(structure):
+                sub_structure = structure['*']
+            elif key in structure:
+                sub_structure = structure[key]
+            else:
+                continue
+
+            for data_function in child.functions:
+                yield data_function
+            for data_function in child._match_fields(sub_structure):
+                yield data_function
+
+    def _match_excludes(self, structure):
+        for key in sorted(self.children):
+            child = self.children[key]
+            if is_structure_wildcard(structure):
+                sub_structure = structure['*']
+            elif key in structure:
+                sub_structure = structure[key]
+            else:
+                # Nothing at or below this path is excluded
+                for data_function in child.all():
+                    yield data_function
+                continue
+
+            if not sub_structure:
+                # This path, and everything below it, is excluded
+                continue
+
+            # Only sub-fields are excluded, so this path itself is wanted
+            if not is_structure_wildcard(sub_structure):
+                for data_function in child.functions:
+                    yield data_function
+            for data_function in child._match_excludes(sub_structure):
+                yield data_function
+
+    @staticmethod
+    def _dedupe(data_functions):
+        seen = set()
+        deduped = []
+        for data_function in data_functions:
+            if data_function not in seen:
+                seen.add(data_function)
+                deduped.append(data_function)
+        return deduped
+
+
+class ColumnPlan(object):
+    """
+    Which concrete columns of `model` a masked serializer will touch
+
+    Plans only depend on the serializer class and the mask, so they may be
+    cached and applied to any number of querysets.
+
+    :needed:        set     Columns read by fields that survive the mask
+    :excluded:      set     Columns only read by fields removed by the mask
+    :required:      set     Columns that must be loaded regardless
+    :related:       dict    Relation name -> ColumnPlan of forward relations
+                            rendered through a nested serializer
+    :unresolved:    set     Surviving sources that are not model fields, and
+                            so must be annotations for anything to be pruned
+    :unknown:       bool    True if a surviving field reads something that
+                            cannot be traced to a column (methods, properties,
+                            `source='*'`), in which case nothing may be pruned
+    """
+
+    def __init__(self, model, is_negated=False, is_masked=True):
+        self.model = model
+        self.is_negated = is_negated
+        self.is_masked = is_masked
+        self.needed = set()
+        self.excluded = set()
+        self.required = set()
+        self.related = {}
+        self.unresolved = set()
+        self.unknown = False
+
+    @classmethod
+    def build(cls, serializer, model, structure, is_negated, required=()):
+        plan = cls(model, is_negated, bool(structure))
+        plan.required.update(required)
+
+        for field in get_serializer_fields(serializer):
+            is_included = should_include_variable(
+                field.field_name, structure, is_negated=is_negated,
+            )
+            columns = plan.needed if is_included else plan.excluded
+
+            if field.source == '*':
+                dependencies = get_data_dependencies(field)
+                if dependencies is None:
+                    plan.unknown = plan.unknown or is_included
+                    continue
+                for dependency in dependencies:
+                    model_field = get_model_field(model, dependency.split('__')[0])
+                    if model_field is None:
+                        plan.unknown = plan.unknown or is_included
+                    elif model_field.concrete:
+                        columns.add(model_field.name)
+                continue
+
+            model_field = get_model_field(model, field.source_attrs[0])
+            if model_field is None:
+                if is_included:
+                    plan.unresolved.add(field.source_attrs[0])
+                continue
+
+            if not model_field.concrete:
+                # Reverse relations and m2m live in other tables
+                continue
+
+            columns.add(model_field.name)
+
+            nested = get_nested_serializer(field)
+            if (
+                is_included and nested is not None and len(field.source_attrs) == 1 and
+                (model_field.many_to_one or model_field.one_to_one)
+            ):
+                plan.related[model_field.name] = cls.build(
+                    nested,
+                    model_field.related_model,
+                    get_sub_structure(structure, field.field_name),
+                    is_negated,
+                )
+
+        return plan
+
+    def is_traceable(self, annotations=()):
+        """
+        :annotations:   iterable    Names annotated onto the queryset
+
+        :returns:       bool        True if every surviving field reads
+                                    known columns or annotations
+        """
+        return not self.unknown and not (self.unresolved - set(annotations))
+
+    def get_only(self, select_related, prefix='', annotations=()):
+        """
+        :select_related:    dict    `Query.select_related` at this level
+
+        :returns:           tuple   (list, bool,) of `.only()` arguments and
+                                    whether anything was actually left out
+        """
+        opts = self.model._meta
+        pk_name = opts.pk.name
+
+        if not self.is_traceable(annotations):
+            names = set(field.name for field in opts.concrete_fields)
+            is_pruned = False
+        else:
+            names = self.needed | self.required
+            names.add(pk_name)
+            is_pruned = bool(set(field.name for field in opts.concrete_fields) - names)
+
+        only = [prefix + name for name in names]
+
+        for name, nested_select in select_related.items():
+            only.append(prefix + name)
+            plan = self.related.get(name)
+            if plan is None:
+                # Not rendered by a nested serializer; leave it whole
+                continue
+            nested_only, nested_is_pruned = plan.get_only(nested_select, prefix + name + '__')
+            only.extend(nested_only)
+            is_pruned = is_pruned or nested_is_pruned
+
+        return only, is_pruned
+
+    def get_defer(self, select_related, prefix='', annotations=()):
+        """
+        :select_related:    dict    `Query.select_related` at this level
+
+        :returns:           list    `.defer()` arguments
+        """
+        defer = []
+
+        if self.is_traceable(annotations):
+            deferrable = self.excluded - self.needed - self.required - set(select_related)
+            deferrable.discard(self.model._meta.pk.name)
+            defer.extend(prefix + name for name in deferrable)
+
+        for name, nested_select in select_related.items():
+            plan = self.related.get(name)
+            if plan is not None:
+                defer.extend(plan.get_defer(nested_select, prefix + name + '__'))
+
+        return defer
+
+    def apply(self, queryset):
+        """
+        Restrict the columns loaded by `queryset`, via `.only()` for
+        `?fields=` and `.defer()` for `?excludes=`.
+
+        Querysets that already customize deferred loading are left alone.
+        """
+        if not self.is_masked:
+            return queryset
+
+        deferred_names, _ = queryset.query.deferred_loading
+        if deferred_names:
+            return queryset
+
+        select_related = get_select_related(queryset)
+        if select_related is None:
+            return queryset
+
+        annotations = queryset.query.annotations
+
+        if self.is_negated:
+            defer = self.get_defer(select_related, annotations=annotations)
+            return queryset.defer(*defer) if defer else queryset
+
+        only, is_pruned = self.get_only(select_related, annotations=annotations)
+        return queryset.only(*only) if is_pruned else queryset
+
+
+def get_select_related(queryset):
+    """
+    :returns:   dict    The queryset's `select_related` tree, or None if it
+                        cannot be inspected (e.g. a bare `select_related()`)
+    """
+    select_related = queryset.query.select_related
+    if select_related is True:
+        return None
+
+    tree = select_related or {}
+
+    def is_forward(model, tree):
+        for name, nested in tree.items():
+            model_field = get_model_field(model, name)
+            if model_field is None or not model_field.concrete:
+                return False
+            if not is_forward(model_field.related_model, nested):
+                return False
+        return True
+
+    if not is_forward(queryset.model, tree):
+        return None
+    return tree
+
+
+def prune_queryset_columns(queryset, serializer, structure, is_negated, required=()):
+    """
+    Restrict the columns loaded by `queryset` to those `serializer` will
+    read once pruned by `structure`.
+
+    :required:  iterable    Column names that must be loaded regardless
+    """
+    plan = ColumnPlan.build(serializer, queryset.model, structure, is_negated, required)
+    return plan.apply(queryset)
+
+
+class PrefetchPlan(object):
+    """
+    A planned `Prefetch`, whose queryset is rebuilt from the plan each time
+    it is needed so that cached plans never share querysets
+    """
+
+    def __init__(self, lookup, model, relation_plan, column_plan=None):
+        self.lookup = lookup
+        self.model = model
+        self.relation_plan = relation_plan
+        self.column_plan = column_plan
+
+    def get_queryset(self):
+        queryset = self.relation_plan.apply(self.model._default_manager.all())
+        if self.column_plan is not None:
+            queryset = self.column_plan.apply(queryset)
+        return queryset
+
+    def build(self):
+        return Prefetch(self.lookup, queryset=self.get_queryset())
+
+    def get_traversal_lookups(self, path, prefetched):
+        """
+        :path:          str     Where the queryset already prefetches this
+                                relation, with a lookup of its own
+        :prefetched:    set     As `get_prefetched_paths`
+
+        :returns:       list    Lookups loading what this plan's queryset
+                                would have, through the existing prefetch
+        """
+        lookups = [path + '__' + lookup for lookup in self.relation_plan.select_related]
+        lookups.extend(self.relation_plan.get_prefetch_lookups(path + '__', prefetched))
+        return lookups
+
+    def add_dependency(self, path):
+        """
+        :path:  str     ORM path, relative to `model`, that something
+                        prefetched through this `Prefetch` will follow
+        """
+        self.relation_plan.collect_dependencies(self.model, [path], '', True)
+        self.relation_plan.select_related = minimize_lookups(self.relation_plan.select_related)
+        self.relation_plan.route_dependencies()
+
+        if self.column_plan is not None:
+            model_field = get_model_field(self.model, path.split('__')[0])
+            if model_field is not None and model_field.concrete:
+                self.column_plan.required.add(model_field.name)
+
+
+class RelationPlan(object):
+    """
+    Relation lookups needed to serialize a masked serializer without N+1s
+
+    Single-valued relations reachable purely through joins become
+    `select_related` lookups. Everything else becomes a `Prefetch` whose
+    queryset is itself planned (and, with `prune_columns`, narrowed) from
+    the nested serializer and its part of the mask.
+
+    :covered:   set     Dotted mask paths already handled elsewhere (i.e., by
+                        a `data_predicate`). They are not planned, and their
+                        descendants are prefetched through them.
+    """
+
+    def __init__(self, covered=(), prune_columns=True):
+        self.covered = set(covered)
+        self.prune_columns = prune_columns
+        self.select_related = []
+        self.prefetch_related = []
+
+    @classmethod
+    def build(cls, serializer, model, structure, is_negated, covered=(), prune_columns=True, mask_prefix=''):
+        plan = cls(covered, prune_columns)
+        plan.collect(serializer, model, structure, is_negated, mask_prefix=mask_prefix)
+        plan.select_related = minimize_lookups(plan.select_related)
+        plan.route_dependencies()
+        return plan
+
+    def collect(self, serializer, model, structure, is_negated, mask_prefix='', lookup_prefix='', is_joined=True):
+        for field in get_serializer_fields(serializer):
+            if not should_include_variable(field.field_name, structure, is_negated=is_negated):
+                continue
+
+            dependencies = get_data_dependencies(field)
+            if dependencies:
+                self.collect_dependencies(model, dependencies, lookup_prefix, is_joined)
+                continue
+
+            nested = get_nested_serializer(field)
+            if nested is None or field.source == '*' or len(field.source_attrs) != 1:
+                continue
+
+            model_field = get_model_field(model, field.source_attrs[0])
+            if model_field is None or not model_field.is_relation or model_field.related_model is None:
+                continue
+
+            mask_path = mask_prefix + field.field_name
+            lookup = lookup_prefix + field.source_attrs[0]
+            sub_structure = get_sub_structure(structure, field.field_name)
+
+            if mask_path in self.covered:
+                self.collect(
+                    nested, model_field.related_model, sub_structure, is_negated,
+                    mask_prefix=mask_path + '.', lookup_prefix=lookup + '__', is_joined=False,
+                )
+            elif is_joined and (model_field.many_to_one or model_field.one_to_one):
+                self.select_related.append(lookup)
+                self.collect(
+                    nested, model_field.related_model, sub_structure, is_negated,
+                    mask_prefix=mask_path + '.', lookup_prefix=lookup + '__', is_joined=True,
+                )
+            else:
+                self.prefetch_related.append(self.plan_prefetch(
+                    lookup, nested, model_field, sub_structure, is_negated, mask_path,
+                ))
+
+    def collect_dependencies(self, model, dependencies, lookup_prefix, is_joined):
+        for dependency in dependencies:
+            relation_path, is_single = resolve_relation_path(model, dependency)
+            if not relation_path:
+                continue
+            if is_joined and is_single:
+                self.select_related.append(lookup_prefix + relation_path)
+            else:
+                self.prefetch_related.append(lookup_prefix + relation_path)
+
+    def route_dependencies(self):
+        """
+        Move plain lookups that pass through a planned `Prefetch` (i.e.,
+        `@data_dependencies('comments__author')` next to a nested `comments`
+        serializer) into that `Prefetch`, so that its pruned queryset keeps
+        the columns they follow
+        """
+        prefetch_plans = [lookup for lookup in self.prefetch_related if isinstance(lookup, PrefetchPlan)]
+        remaining = []
+        for lookup in self.prefetch_related:
+            if not isinstance(lookup, PrefetchPlan):
+                for prefetch_plan in prefetch_plans:
+                    if lookup.startswith(prefetch_plan.lookup + '__'):
+                        prefetch_plan.add_dependency(lookup[len(prefetch_plan.lookup) + 2:])
+                        break
+                else:
+                    remaining.append(lookup)
+                continue
+            remaining.append(lookup)
+        self.prefetch_related = remaining
+
+    def plan_prefetch(self, lookup, serializer, model_field, structure, is_negated, mask_path):
+        """
+        :returns:   PrefetchPlan    For `lookup`, whose queryset loads just
+                                    what `serializer` needs under `structure`
+        """
+        related_model = model_field.related_model
+
+        relation_plan = self.build(
+            serializer, related_model, structure, is_negated,
+            covered=self.covered, prune_columns=self.prune_columns, mask_prefix=mask_path + '.',
+        )
+
+        column_plan = None
+        if self.prune_columns:
+            if isinstance(model_field, ForeignObjectRel):
+                # Reverse foreign keys are matched back to their parent
+                # through the foreign key column on the related model
+                required = () if model_field.many_to_many else (model_field.field.name,)
+                column_plan = ColumnPlan.build(serializer, related_model, structure, is_negated, required)
+            elif model_field.concrete:
+                column_plan = ColumnPlan.build(serializer, related_model, structure, is_negated)
+
+        return PrefetchPlan(lookup, related_model, relation_plan, column_plan)
+
+    def count_prefetches(self):
+        """
+        :returns:   int     Prefetches this plan adds, including those
+                            nested in planned `Prefetch` querysets; each
+                            runs a query of its own
+        """
+        count = 0
+        for lookup in self.prefetch_related:
+            if isinstance(lookup, PrefetchPlan):
+                count += 1 + lookup.relation_plan.count_prefetches()
+            else:
+                count += len(lookup.split('__'))
+        return count
+
+    def get_prefetch_lookups(self, prefix='', prefetched=()):
+        """
+        :prefetched:    set     As `get_prefetched_paths`. Planned prefetches
+                                into these paths are left to the existing
+                                lookups, and only traversed
+
+        :returns:       list    Lookups and `Prefetch` objects
+        """
+        lookups = []
+        for lookup in self.prefetch_related:
+            if not isinstance(lookup, PrefetchPlan):
+                lookups.append(prefix + lookup)
+            elif prefix + lookup.lookup in prefetched:
+                lookups.extend(lookup.get_traversal_lookups(prefix + lookup.lookup, prefetched))
+            else:
+                lookups.append(Prefetch(prefix + lookup.lookup, queryset=lookup.get_queryset()))
+        return lookups
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(
+                *self.get_prefetch_lookups(prefetched=get_prefetched_paths(queryset))
+            )
+        return queryset
+
+
+def infer_related_lookups(queryset, serializer, structure, is_negated, covered=(), prune_columns=True):
+    """
+    Add the `select_related` and `prefetch_related` lookups that `serializer`,
+    once pruned by `structure`, needs in order to avoid N+1 queries.
+    """
+    plan = RelationPlan.build(serializer, queryset.model, structure, is_negated, covered, prune_columns)
+    return plan.apply(queryset)
+
+
+def build_masked_prefetch(serializer, model, dotted_path, structure, is_negated, covered=(), prune_columns=True):
+    """
+    :dotted_path:   str         Mask path of a nested serializer field, like
+                                `comments` or `author.accounts`
+
+    :returns:       Prefetch    For the relation behind `dotted_path`, planned
+                                like `infer_related_lookups` would plan it
+    """
+    lookup = []
+    mask_path = []
+    field = model_field = None
+
+    for field_name in dotted_path.split('.'):
+        if field is not None:
+            serializer = get_nested_serializer(field)
+            model = model_field.related_model
+            structure = get_sub_structure(structure, field.field_name)
+
+        fields = dict((candidate.field_name, candidate) for candidate in get_serializer_fields(serializer))
+        field = fields.get(field_name)
+        if field is None or get_nested_serializer(field) is None or len(field.source_attrs) != 1:
+            raise ValueError('`%s` is not a nested serializer field' % dotted_path)
+
+        model_field = get_model_field(model, field.source_attrs[0])
+        if model_field is None or not model_field.is_relation or model_field.related_model is None:
+            raise ValueError('`%s` is not backed by a model relation' % dotted_path)
+
+        lookup.append(field.source_attrs[0])
+        mask_path.append(field_name)
+
+    plan = RelationPlan(covered, prune_columns)
+    return plan.plan_prefetch(
+        '__'.join(lookup),
+        get_nested_serializer(field),
+        model_field,
+        get_sub_structure(structure, field.field_name),
+        is_negated,
+        '.'.join(mask_path),
+    ).build()
@@ -0,0 +1,261 @@
+from __future__ import unicode_literals
+
+import json
+from collections import OrderedDict
+
+from django.db.models import (
+    Aggregate, F, Func, OuterRef, Subquery, TextField, Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import six
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.serializers import ListSerializer
+
+from .codegen import INTEGER, TEXT, get_field_strategy
+from .planning import (
+    get_data_dependencies, get_lookup_path, get_model_field,
+    get_nested_serializer,
+)
+from .serializers import has_default_representation
+
+# Model fields whose database value is already what the serializer's
+# `CharField` / `IntegerField` would produce
+TEXT_TYPES = frozenset([
+    'CharField', 'EmailField', 'SlugField', 'TextField', 'URLField',
+])
+INTEGER_TYPES = frozenset([
+    'AutoField', 'BigAutoField', 'BigIntegerField', 'IntegerField',
+    'PositiveIntegerField', 'PositiveSmallIntegerField', 'SmallIntegerField',
+])
+
+ANNOTATION_NAME = '_jsonmask_projection'
+
+
+class JSONObject(Func):
+    """
+    `JSON_OBJECT(key, value, ...)`, keeping the order of `pairs`
+
+    :pairs:     list    Of (key, expression,)
+    """
+
+    function = 'JSON_OBJECT'
+
+    def __init__(self, pairs):
+        expressions = []
+        for key, expression in pairs:
+            expressions.extend([Value(key), expression])
+        super(JSONObject, self).__init__(*expressions, output_field=TextField())
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='JSON_BUILD_OBJECT', **extra_context)
+
+
+class JSONArray(Func):
+    """
+    An empty JSON array
+    """
+
+    function = 'JSON_ARRAY'
+
+    def __init__(self):
+        super(JSONArray, self).__init__(output_field=TextField())
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='JSON_BUILD_ARRAY', **extra_context)
+
+
+class JSONArrayAgg(Aggregate):
+    function = 'JSON_GROUP_ARRAY'
+
+    def __init__(self, expression):
+        super(JSONArrayAgg, self).__init__(expression, output_field=TextField())
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='JSON_AGG', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='JSON_ARRAYAGG', **extra_context)
+
+
+class JSONValue(Func):
+    """
+    Marks text returned by a subquery as JSON, so that it is nested as an
+    object or array rather than as a string. Only SQLite needs this
+    """
+
+    template = '%(expressions)s'
+
+    def __init__(self, expression):
+        super(JSONValue, self).__init__(expression, output_field=TextField())
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='JSON(%(expressions)s)', **extra_context)
+
+
+def get_column_expression(model, field):
+    """
+    :returns:   F   For fields whose column value is, as JSON, identical to
+                    their representation, or None
+    """
+    strategy, attname = get_field_strategy(model, field)
+    if strategy not in (TEXT, INTEGER):
+        return None
+    internal_type = get_model_field(model, field.source_attrs[0]).get_internal_type()
+    if strategy == TEXT and internal_type not in TEXT_TYPES:
+        return None
+    if strategy == INTEGER and internal_type not in INTEGER_TYPES:
+        return None
+    return F(attname)
+
+
+def get_nested_expression(model, field):
+    """
+    :returns:   Expression  Subquery building the JSON for a nested serializer
+                            over a foreign key, one-to-one or reverse foreign
+                            key, or None
+    """
+    serializer = get_nested_serializer(field)
+    if len(field.source_attrs) != 1 or not has_default_representation(serializer):
+        return None
+
+    model_field = get_model_field(model, field.source_attrs[0])
+    if model_field is None or not model_field.is_relation or model_field.related_model is None:
+        return None
+    related_model = model_field.related_model
+    if getattr(getattr(serializer, 'Meta', None), 'model', None) is not related_model:
+        return None
+
+    pairs, fallback_fields = build_pairs(serializer, related_model)
+    if fallback_fields:
+        return None
+    json_object = JSONObject(pairs)
+
+    if isinstance(field, ListSerializer):
+        if not model_field.one_to_many:
+            return None
+        foreign_key = model_field.field
+        rows = related_model._default_manager.filter(**{
+            foreign_key.name: OuterRef(foreign_key.target_field.attname),
+        }).order_by().values(foreign_key.name).annotate(
+            json=JSONArrayAgg(json_object),
+        ).values('json')
+        return JSONValue(Coalesce(Subquery(rows, output_field=TextField()), JSONArray()))
+
+    if model_field.many_to_one or (model_field.one_to_one and model_field.concrete):
+        rows = related_model._default_manager.filter(**{
+            model_field.target_field.name: OuterRef(model_field.attname),
+        }).order_by().annotate(json=json_object).values('json')
+        return JSONValue(Subquery(rows, output_field=TextField()))
+
+    return None
+
+
+def build_pairs(serializer, model):
+    """
+    :serializer:    Serializer  Already masked
+
+    :returns:       tuple       ([(field name, expression)], [fields that
+                                can only be represented in Python],)
+    """
+    pairs = []
+    fallback_fields = []
+    for field in serializer._readable_fields:
+        if get_nested_serializer(field) is None:
+            expression = get_column_expression(model, field)
+        else:
+            expression = get_nested_expression(model, field)
+
+        if expression is None:
+            fallback_fields.append(field)
+        else:
+            pairs.append((field.field_name, expression))
+    return pairs, fallback_fields
+
+
+class JSONProjection(object):
+    """
+    The part of a masked serializer's output the database can build
+
+    :pairs:             list    Of (field name, expression,)
+    :fields:            list    The serializer's readable fields, in order
+    :fallback_fields:   list    Those of `fields` missing from `pairs`
+    """
+
+    def __init__(self, pairs, fields, fallback_fields):
+        self.pairs = pairs
+        self.fields = fields
+        self.fallback_fields = fallback_fields
+        self.fallback_names = set(field.field_name for field in fallback_fields)
+
+    @classmethod
+    def build(cls, serializer, model):
+        """
+        :returns:   JSONProjection  Or None, if no field can be projected
+        """
+        if not has_default_representation(serializer):
+            return None
+        pairs, fallback_fields = build_pairs(serializer, model)
+        if not pairs:
+            return None
+        return cls(pairs, serializer._readable_fields, fallback_fields)
+
+    @property
+    def is_complete(self):
+        return not self.fallback_fields
+
+    def apply(self, queryset):
+        """
+        :returns:   QuerySet    Of model instances annotated with the
+                                projection or, if it is complete, of the
+                                projected JSON alone
+        """
+        queryset = queryset.annotate(**{ANNOTATION_NAME: JSONObject(self.pairs)})
+        if self.is_complete:
+            return queryset.prefetch_related(None).values_list(ANNOTATION_NAME, flat=True)
+
+        # Relations projected in SQL need not be prefetched as well, unless
+        # a fallback field reads them too
+        projected = set(
+            field.source_attrs[0] for field in self.fields
+            if field.field_name not in self.fallback_names and field.source_attrs
+        )
+        for field in self.fallback_fields:
+            projected.difference_update(field.source_attrs[:1])
+            for lookup in get_data_dependencies(field) or ():
+                projected.discard(lookup.split('__')[0])
+        lookups = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if get_lookup_path(lookup).split('__')[0] not in projected
+        ]
+        return queryset.prefetch_related(None).prefetch_related(*lookups)
+
+    def load(self, value):
+        # PostgreSQL drivers may hand back JSON already decoded
+        if isinstance(value, (six.text_type, six.binary_type)):
+            return json.loads(value, object_pairs_hook=OrderedDict)
+        return value
+
+    def to_representation(self, row):
+        """
+        :row:       Model instance or projected JSON, from `apply`
+
+        :returns:   OrderedDict
+        """
+        if self.is_complete:
+            return self.load(row)
+
+        projected = self.load(getattr(row, ANNOTATION_NAME))
+        ret = OrderedDict()
+        for field in self.fields:
+            if field.field_name not in self.fallback_names:
+                ret[field.field_name] = projected[field.field_name]
+                continue
+
+            try:
+                attribute = field.get_attribute(row)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            ret[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+        return ret
@@ -0,0 +1,190 @@
+from __future__ import unicode_literals
+
+import json
+from collections import OrderedDict
+
+from django.utils import six
+from rest_framework import exceptions, status
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+from .maskers import compile_mask
+from .utils import collapse_includes_excludes, extract_json_mask_from_request
+
+
+def encode_masked(data, masker, dumps, separators=SHORT_SEPARATORS):
+    """
+    Encode `data` as JSON, leaving out whatever `masker` excludes, without
+    building a masked copy of the whole of it first
+
+    Dicts along the mask's paths are walked key by key, and lists are masked
+    item by item. Everything else, including whole subtrees the mask keeps
+    as they are, goes to `dumps` in one call. Each item is encoded as soon
+    as it is masked, so only the output accumulates.
+
+    :masker:        CompiledMask    Or `EnvelopeMask`
+    :dumps:         callable        Encodes one value to bytes
+    :separators:    tuple           (item separator, key separator,)
+
+    :returns:       bytes
+    """
+    item_separator, key_separator = (separator.encode('utf-8') for separator in separators)
+    # Encoded `"key":` prefixes, since the same few keys recur on every item
+    prefixes = {}
+
+    def prefix(key):
+        encoded = prefixes.get(key)
+        if encoded is None:
+            encoded = prefixes[key] = dumps(key) + key_separator
+        return encoded
+
+    def encode(value, masker):
+        if isinstance(value, dict):
+            children = masker.children
+            kept = []
+            nested = False
+            for key, item in value.items():
+                # JSON object keys are always strings
+                if not isinstance(key, six.string_types):
+                    key = six.text_type(key)
+                if masker.includes(key):
+                    kept.append((key, item))
+                    nested = nested or key in children
+            # Below the mask's paths, a shallow copy is cheaper to hand to
+            # `dumps` than encoding key by key
+            if not nested:
+                return dumps(OrderedDict(kept))
+            return b'{' + item_separator.join(
+                prefix(key) + (
+                    dumps(item) if key not in children else encode(item, children[key])
+                )
+                for key, item in kept
+            ) + b'}'
+        if isinstance(value, (list, tuple)):
+            return b'[' + item_separator.join(encode(item, masker) for item in value) + b']'
+        return dumps(value)
+
+    return encode(data, masker)
+
+
+def mask_data(data, masker):
+    """
+    Masked copy of `data`, as `encode_masked` would encode it
+
+    :returns:   OrderedDict, list or `data` itself
+    """
+    if isinstance(data, dict):
+        children = masker.children
+        masked = OrderedDict()
+        for key, item in data.items():
+            if not isinstance(key, six.string_types):
+                key = six.text_type(key)
+            if masker.includes(key):
+                child = children.get(key)
+                masked[key] = item if child is None else mask_data(item, child)
+        return masked
+    if isinstance(data, (list, tuple)):
+        return [mask_data(item, masker) for item in data]
+    return data
+
+
+class EnvelopeMask(object):
+    """
+    Stands in for a `CompiledMask` over a paginated response, keeping its
+    envelope whole and masking only its results
+    """
+
+    __slots__ = ('children',)
+
+    def __init__(self, results_field, masker):
+        self.children = {results_field: masker}
+
+    def includes(self, key):
+        return True
+
+
+class JSONMaskRenderer(JSONRenderer):
+    """
+    Applies the request's `fields` / `excludes` mask while encoding, so
+    any view can honour it, including those that never use this package's
+    mixins. Lists are masked item by item, and paginated responses keep
+    their envelope, e.g. `count` and `next`, with only `results` masked.
+
+    Responses from `OptimizedQuerySetMixin` views, which are masked by
+    their serializers already, and error responses are rendered as usual.
+
+    To use a faster encoder, override `dumps`.
+    """
+
+    # Key of the masked list in paginated responses
+    results_field = 'results'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        try:
+            masker = self.get_masker(data, renderer_context)
+        except exceptions.ParseError as exc:
+            response = renderer_context.get('response')
+            if response is not None:
+                response.status_code = status.HTTP_400_BAD_REQUEST
+            data, masker = {'detail': exc.detail}, None
+
+        if masker is None:
+            return super(JSONMaskRenderer, self).render(data, accepted_media_type, renderer_context)
+
+        # Pretty printing is left to `json.dumps`
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super(JSONMaskRenderer, self).render(
+                mask_data(data, masker), accepted_media_type, renderer_context,
+            )
+
+        separators = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        return encode_masked(data, masker, self.dumps, separators)
+
+    def get_masker(self, data, renderer_context):
+        """
+        :returns:   CompiledMask    For the request's mask, or None if the
+                                    response should not be masked here
+        """
+        from .views import OptimizedQuerySetMixin
+
+        request = renderer_context.get('request')
+        view = renderer_context.get('view')
+        response = renderer_context.get('response')
+        if data is None or request is None or isinstance(view, OptimizedQuerySetMixin):
+            return None
+        if response is not None and (response.exception or response.status_code >= 400):
+            return None
+
+        try:
+            includes, excludes = extract_json_mask_from_request(request, getattr(view, 'field_presets', None))
+        except ValueError as exc:
+            raise exceptions.ParseError(six.text_type(exc))
+        json_mask, is_negated = collapse_includes_excludes(includes, excludes)
+        if not json_mask:
+            return None
+
+        masker = compile_mask(json_mask, is_negated)
+        if (
+            getattr(view, 'paginator', None) is not None and
+            isinstance(data, dict) and
+            isinstance(data.get(self.results_field), (list, tuple))
+        ):
+            return EnvelopeMask(self.results_field, masker)
+        return masker
+
+    def dumps(self, value):
+        """
+        :returns:   bytes   `value` encoded as JSON, as `JSONRenderer` would
+                            encode it. Override to plug in another encoder,
+                            e.g. `return orjson.dumps(value)`
+        """
+        ret = json.dumps(
+            value, cls=self.encoder_class, ensure_ascii=self.ensure_ascii,
+            allow_nan=not self.strict,
+            separators=SHORT_SEPARATORS if self.compact else LONG_SEPARATORS,
+        )
+        if isinstance(ret, six.text_type):
+            ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+            return ret.encode('utf-8')
+        return ret
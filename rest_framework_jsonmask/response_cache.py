@@ -0,0 +1,109 @@
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.utils import six
+from rest_framework.serializers import BaseSerializer
+
+from . import constants
+
+# Concrete model label -> aliases of the caches holding responses built
+# from that model
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_model_label(model):
+    return model._meta.concrete_model._meta.label
+
+
+def get_serializer_models(serializer_class):
+    """
+    :returns:   set     Models `serializer_class` and the nested serializers
+                        it declares represent
+    """
+    models = set()
+    pending = [serializer_class]
+    seen = set()
+    while pending:
+        serializer_class = pending.pop()
+        if serializer_class in seen:
+            continue
+        seen.add(serializer_class)
+
+        model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+        if model is not None:
+            models.add(model)
+        for field in getattr(serializer_class, '_declared_fields', {}).values():
+            field = getattr(field, 'child', field)
+            if isinstance(field, BaseSerializer):
+                pending.append(field.__class__)
+    return models
+
+
+def register_models(models, alias):
+    """
+    Have saving or deleting any of `models` invalidate the responses cached
+    in `alias` that depend on it
+
+    :returns:   tuple   Sorted labels of `models`
+    """
+    labels = sorted(set(get_model_label(model) for model in models))
+    with _registry_lock:
+        for label in labels:
+            _registry.setdefault(label, set()).add(alias)
+    return tuple(labels)
+
+
+def get_version_key(label):
+    return '%s:model-version:%s' % (constants.RESPONSE_CACHE_PREFIX, label,)
+
+
+def get_model_versions(cache, labels):
+    """
+    :returns:   list    Current version of each of `labels`. Versions are
+                        random, so one evicted from the cache is never
+                        reissued
+    """
+    keys = [get_version_key(label) for label in labels]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_model(model):
+    """
+    Invalidate every cached response built from `model`
+    """
+    label = get_model_label(model)
+    for alias in _registry.get(label, ()):
+        caches[alias].set(get_version_key(label), uuid.uuid4().hex, None)
+
+
+def invalidate_on_change(sender, **kwargs):
+    if get_model_label(sender) in _registry:
+        invalidate_model(sender)
+
+
+def get_response_cache_key(parts):
+    """
+    :parts:     list    JSON-serializable values identifying a response
+
+    :returns:   str
+    """
+    digest = hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=six.text_type).encode('utf-8'),
+    ).hexdigest()
+    return '%s:response:%s' % (constants.RESPONSE_CACHE_PREFIX, digest,)
+
+
+post_save.connect(invalidate_on_change, dispatch_uid='rest_framework_jsonmask.response_cache.post_save')
+post_delete.connect(invalidate_on_change, dispatch_uid='rest_framework_jsonmask.response_cache.post_delete')
@@ -1,21 +1,309 @@
 from __future__ import unicode_literals
 
+from collections import OrderedDict
+from timeit import default_timer
+
+from django.conf import settings
+from django.db.models import Model
+from django.utils import six
 from django.utils.functional import cached_property
-from jsonmask import should_include_variable
+from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.utils.serializer_helpers import BindingDict
+
+from . import constants, signals
+from .cache import LRUCache, get_cache
+from .codegen import get_representation_function
+from .maskers import compile_mask
+from .utils import collapse_includes_excludes, compile_presets, parse_mask
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+
+class MaskedContext(Mapping):
+    """
+    Read-only view of a serializer context, as seen by one nested field
+
+    Lookups fall through to the root context, except for `requested_fields`
+    and `excluded_fields`, which hold the part of the mask below that field.
+    Nested serializers walk further down by wrapping the same root context
+    again, so the context itself is never copied.
+
+    :context:           dict    Serializer context
+    :requested_fields:  dict    Parsed `?fields=` mask below this field
+    :excluded_fields:   dict    Parsed `?excludes=` mask below this field
+    """
+
+    __slots__ = ('context', 'requested_fields', 'excluded_fields',)
+
+    MASK_KEYS = ('requested_fields', 'excluded_fields',)
+
+    def __init__(self, context, requested_fields=None, excluded_fields=None):
+        if isinstance(context, MaskedContext):
+            context = context.context
+        self.context = context
+        self.requested_fields = requested_fields
+        self.excluded_fields = excluded_fields
+
+    def __getitem__(self, key):
+        if key == 'requested_fields':
+            return self.requested_fields
+        if key == 'excluded_fields':
+            return self.excluded_fields
+        return self.context[key]
+
+    def __iter__(self):
+        for key in self.context:
+            if key not in self.MASK_KEYS:
+                yield key
+        for key in self.MASK_KEYS:
+            yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def copy(self):
+        return dict(self)
+
+
+class FieldPlan(object):
+    """
+    Which fields of one serializer class survive one mask
 
-from .utils import collapse_includes_excludes
+    :masker:            CompiledMask    Decides each field name
+    :declared_fields:   OrderedDict     The class's declared fields, less
+                                        those the mask removes
+    """
+
+    __slots__ = ('masker', 'declared_fields',)
+
+    def __init__(self, serializer_class, masker):
+        self.masker = masker
+        self.declared_fields = OrderedDict(
+            (field_name, field)
+            for field_name, field in serializer_class._declared_fields.items()
+            if masker.includes(field_name)
+        )
+
+    def includes(self, field_name):
+        return self.masker.includes(field_name)
+
+
+def has_default_representation(serializer):
+    """
+    :returns:   bool    True if `serializer`, and any `many=True` list of
+                        it, represent instances field by field, the way
+                        `Serializer.to_representation` does
+    """
+    meta = getattr(serializer, 'Meta', None)
+    if getattr(meta, 'list_serializer_class', ListSerializer) is not ListSerializer:
+        return False
+    return six.get_unbound_function(type(serializer).to_representation) in (
+        six.get_unbound_function(FieldsListSerializerMixin.to_representation),
+        six.get_unbound_function(Serializer.to_representation),
+    )
+
+
+def get_field_plan(serializer_class, structure, is_negated=False):
+    """
+    :returns:   FieldPlan   Shared by every instance of `serializer_class`
+                            handed an equal mask
+    """
+    masker = compile_mask(structure, is_negated)
+    cache = get_cache('REST_FRAMEWORK_JSONMASK_FIELD_PLAN_CACHE_SIZE', constants.FIELD_PLAN_CACHE_SIZE)
+    key = (serializer_class, masker.mask.fingerprint, is_negated)
+    field_plan = cache.get(key)
+    if field_plan is None:
+        field_plan = FieldPlan(serializer_class, masker)
+        cache.set(key, field_plan)
+    return field_plan
+
+
+def get_representation_memo(context):
+    """
+    :returns:   LRUCache    Representations already built for the request in
+                            `context`, or None if there is no request
+    """
+    request = context.get('request')
+    if request is None:
+        return None
+    memo = getattr(request, '_jsonmask_representations', None)
+    if memo is None:
+        memo = request._jsonmask_representations = LRUCache(
+            maxsize=getattr(settings, 'REST_FRAMEWORK_JSONMASK_MEMO_SIZE', constants.MEMO_SIZE),
+        )
+    return memo
 
 
 class FieldsListSerializerMixin(object):
 
+    # Named masks that raw string masks in the context may refer to as
+    # `@name`, e.g. `{'summary': 'id,title'}`
+    field_presets = None
+
+    # Serialize model instances with a function generated for the fields
+    # that survive the mask. Only applies to ModelSerializers
+    compile_representation = False
+
+    # Reuse the representation of a model instance already serialized by
+    # this class, under the same mask, earlier in the same request. Meant
+    # for nested serializers of objects that recur, e.g. authors. The
+    # representation is shared, so it must not be modified afterwards
+    memoize_representation = False
+
+    @classmethod
+    def get_field_presets(cls):
+        if '_compiled_field_presets' not in cls.__dict__:
+            cls._compiled_field_presets = compile_presets(cls.field_presets)
+        return cls._compiled_field_presets
+
     @cached_property
     def _readable_fields(self):
+        if signals.has_listeners(signals.fields_pruned, self.__class__):
+            return self.send_fields_pruned()
         readable_fields = super(FieldsListSerializerMixin, self)._readable_fields
         return self.prune_readable_fields(readable_fields)
 
+    def send_fields_pruned(self):
+        """
+        Prune readable fields as `_readable_fields` does, then send
+        `fields_pruned` with what was removed and how long it took
+        """
+        start = default_timer()
+        readable_fields = super(FieldsListSerializerMixin, self)._readable_fields
+        pruned_fields = self.prune_readable_fields(readable_fields)
+        duration = default_timer() - start
+
+        structure, is_negated = collapse_includes_excludes(
+            self._get_context_mask('requested_fields'), self._get_context_mask('excluded_fields'),
+        )
+        if structure:
+            kept = [field.field_name for field in pruned_fields]
+            signals.fields_pruned.send(
+                sender=self.__class__, serializer=self,
+                fingerprint=compile_mask(structure, is_negated).mask.fingerprint, is_negated=is_negated,
+                kept=kept,
+                pruned=[
+                    field.field_name for field in self.get_all_fields().values()
+                    if not field.write_only and field.field_name not in kept
+                ],
+                duration=duration,
+            )
+        return pruned_fields
+
+    def to_representation(self, instance):
+        memo_key = self.get_memo_key(instance)
+        if memo_key is None:
+            return self.build_representation(instance)
+
+        memo = get_representation_memo(self._context)
+        ret = memo.get(memo_key)
+        if ret is None:
+            ret = self.build_representation(instance)
+            memo.set(memo_key, ret)
+        return ret
+
+    def get_memo_key(self, instance):
+        """
+        :returns:   tuple   (serializer class, mask fingerprint, is_negated,
+                            model, pk,) identifying `instance`'s
+                            representation within the request, or None if
+                            it is not to be memoized
+        """
+        prefix = self._memo_key_prefix
+        if prefix is None or not isinstance(instance, Model) or instance.pk is None:
+            return None
+        return prefix + (instance.__class__, instance.pk,)
+
+    @cached_property
+    def _memo_key_prefix(self):
+        if not self.memoize_representation or get_representation_memo(self._context) is None:
+            return None
+        structure, is_negated = collapse_includes_excludes(
+            self._get_context_mask('requested_fields'), self._get_context_mask('excluded_fields'),
+        )
+        return (self.__class__, compile_mask(structure, is_negated).mask.fingerprint, is_negated,)
+
+    def build_representation(self, instance):
+        representation_function = self._representation_function
+        if representation_function is None or not isinstance(instance, self.Meta.model):
+            return super(FieldsListSerializerMixin, self).to_representation(instance)
+        return representation_function(instance, self._readable_fields)
+
+    @cached_property
+    def _representation_function(self):
+        if not self.compile_representation or not hasattr(getattr(self, 'Meta', None), 'model'):
+            return None
+        return get_representation_function(self.__class__, self.Meta.model, self._readable_fields)
+
+    def get_field_plan(self):
+        """
+        :returns:   FieldPlan   For the mask in this serializer's context, or
+                                None if there is no mask, or if this is
+                                (part of) a serializer handed `data`, which
+                                needs all of its fields to validate it
+        """
+        if hasattr(self.root, 'initial_data'):
+            return None
+
+        requested_fields = self._get_context_mask('requested_fields')
+        excluded_fields = self._get_context_mask('excluded_fields')
+        if not requested_fields and not excluded_fields:
+            return None
+
+        structure, is_negated = collapse_includes_excludes(
+            requested_fields, excluded_fields,
+        )
+        return get_field_plan(self.__class__, structure, is_negated)
+
+    def get_fields(self):
+        """
+        Only build, and deep-copy, the fields that survive the mask
+        """
+        field_plan = self.get_field_plan()
+        if field_plan is None:
+            return super(FieldsListSerializerMixin, self).get_fields()
+
+        # Shadow the class attribute for the duration of the build
+        self._declared_fields = field_plan.declared_fields
+        self._field_plan = field_plan
+        try:
+            return super(FieldsListSerializerMixin, self).get_fields()
+        finally:
+            del self._declared_fields
+            del self._field_plan
+
+    def get_field_names(self, declared_fields, info):
+        field_names = super(FieldsListSerializerMixin, self).get_field_names(declared_fields, info)
+        field_plan = getattr(self, '_field_plan', None)
+        if field_plan is None:
+            return field_names
+        return [field_name for field_name in field_names if field_plan.includes(field_name)]
+
+    def get_all_fields(self):
+        """
+        :returns:   dict    Every field, regardless of the mask in the
+                            context, e.g. to plan queries with
+        """
+        if self.get_field_plan() is None:
+            return self.fields
+        all_fields = BindingDict(self)
+        for key, value in super(FieldsListSerializerMixin, self).get_fields().items():
+            all_fields[key] = value
+        return all_fields
+
+    def _get_context_mask(self, key):
+        mask = self._context.get(key) or {}
+        if isinstance(mask, six.string_types):
+            # Allow callers to hand over raw `?fields=`-style strings
+            mask = parse_mask(mask, self.get_field_presets()) or {}
+        return mask
+
     def prune_readable_fields(self, readable_fields):
-        requested_fields = self._context.get('requested_fields') or {}
-        excluded_fields = self._context.get('excluded_fields') or {}
+        requested_fields = self._get_context_mask('requested_fields')
+        excluded_fields = self._get_context_mask('excluded_fields')
 
         if not requested_fields and not excluded_fields:
             return readable_fields
@@ -23,26 +311,28 @@ class FieldsListSerializerMixin(object):
         structure, is_negated = collapse_includes_excludes(
             requested_fields, excluded_fields,
         )
+        includes = compile_mask(structure, is_negated).includes
 
         pruned_fields = [
             field
             for field in readable_fields
-            if should_include_variable(
-                field.field_name, structure, is_negated=is_negated,
-            )
+            if includes(field.field_name)
         ]
 
+        unmasked_context = None
         for field in pruned_fields:
-            field._context = self._context.copy()
+            field_requested = requested_fields.get(field.field_name)
+            field_excluded = excluded_fields.get(field.field_name)
 
-            field._context['requested_fields'] = requested_fields.copy().get(
-                field.field_name,
-            )
-            field._context['excluded_fields'] = excluded_fields.copy().get(
-                field.field_name,
-            )
+            if field_requested or field_excluded:
+                field._context = MaskedContext(self._context, field_requested, field_excluded)
+            else:
+                # Shared by every field with nothing masked below it
+                if unmasked_context is None:
+                    unmasked_context = MaskedContext(self._context)
+                field._context = unmasked_context
 
             if hasattr(field, 'child'):
-                field.child._context = field._context.copy()
+                field.child._context = field._context
 
         return pruned_fields
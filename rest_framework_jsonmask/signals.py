@@ -0,0 +1,52 @@
+from __future__ import unicode_literals
+
+from django.dispatch import Signal
+
+# Sent by `utils.parse_mask` for every non-empty mask, with `sender=None`
+#   text        str     Raw mask
+#   fingerprint str     `FrozenMask.fingerprint` of the parsed mask
+#   cached      bool    True if the parsed mask came from the mask cache
+#   duration    float   Seconds spent, including any cache lookup
+mask_parsed = Signal()
+
+# Sent by `OptimizedQuerySetMixin.optimize_queryset`, with the view class
+# as sender
+#   view            OptimizedQuerySetMixin
+#   fingerprint     str     Of the mask in use, or None
+#   is_negated      bool    True if the mask came from `excludes`
+#   data_functions  list    Names of the data predicates and annotations
+#                           applied, in order
+#   duration        float   Seconds spent building the queryset
+queryset_optimized = Signal()
+
+# Sent by `FieldsListSerializerMixin` whenever a mask prunes a serializer's
+# fields, with the serializer class as sender
+#   serializer      FieldsListSerializerMixin
+#   fingerprint     str     Of the part of the mask applied to `serializer`
+#   is_negated      bool
+#   kept            list    Names of the readable fields left
+#   pruned          list    Names of the readable fields removed
+#   duration        float
+fields_pruned = Signal()
+
+# Sent once `OptimizedQuerySetMixin` has handled a request, with the view
+# class as sender
+#   view            OptimizedQuerySetMixin
+#   request         Request
+#   response        Response
+#   fingerprint     str     Of the mask in use, or None
+#   is_negated      bool
+#   queries         int     Queries run on the default database while
+#                           handling the request, or None on Django < 2.0.
+#                           Excludes those run while a streamed response
+#                           is consumed
+#   duration        float   Seconds spent handling the request
+request_masked = Signal()
+
+
+def has_listeners(signal, sender=None):
+    """
+    Cheaper than `Signal.has_listeners`, which takes a lock, when nothing is
+    connected; instrumented code checks this before measuring anything
+    """
+    return bool(signal.receivers) and signal.has_listeners(sender)
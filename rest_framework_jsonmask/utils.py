@@ -1,21 +1,263 @@
 from __future__ import unicode_literals
 
+import hashlib
+from timeit import default_timer
+
 from django.conf import settings
-from jsonmask import apply_json_mask, parse_fields
+from jsonmask import parse_fields
+from rest_framework import exceptions
+
+from . import constants, signals
+from .cache import get_cache
+
+
+class FrozenMask(dict):
+    """
+    Immutable, hashable version of a parsed jsonmask structure
+
+    Behaves exactly like the nested dicts returned by `jsonmask.parse_fields`,
+    so it can be handed to `should_include_variable` and `apply_json_mask`,
+    but may be safely shared between threads and requests.
+    """
+
+    __slots__ = ('_hash', '_fingerprint',)
+
+    def __init__(self, structure=None):
+        super(FrozenMask, self).__init__(
+            (key, value if isinstance(value, FrozenMask) else FrozenMask(value))
+            for key, value in (structure or {}).items()
+        )
+        self._hash = None
+        self._fingerprint = None
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('%s is immutable' % self.__class__.__name__)
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self.items()))
+        return self._hash
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def to_text(self):
+        """
+        :returns:   str     Canonical mask syntax, with keys sorted, so
+                            `b,a/c` and `a(c),b` both give `a(c),b`
+        """
+        return ','.join(
+            '%s(%s)' % (key, value.to_text()) if value else key
+            for key, value in sorted(self.items())
+        )
+
+    @property
+    def fingerprint(self):
+        """
+        Short digest of `to_text()`, stable across processes
+        """
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.sha1(self.to_text().encode('utf-8')).hexdigest()[:16]
+        return self._fingerprint
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, dict.__repr__(self))
+
+
+def get_mask_cache():
+    """
+    :returns:   LRUCache    Process-wide cache of raw mask strings to
+                            their parsed `FrozenMask`
+    """
+    return get_cache('REST_FRAMEWORK_JSONMASK_CACHE_SIZE', constants.MASK_CACHE_SIZE)
+
+
+def get_mask_limit(name):
+    return getattr(settings, 'REST_FRAMEWORK_JSONMASK_%s' % name, getattr(constants, name))
+
+
+def check_mask_length(text):
+    max_length = get_mask_limit('MAX_MASK_LENGTH')
+    if max_length is not None and len(text) > max_length:
+        raise exceptions.ParseError(
+            'Field mask is too long (%d characters, at most %d allowed)' % (len(text), max_length,)
+        )
+
+
+def measure_mask(text):
+    """
+    Single pass over a raw mask, without parsing it
+
+    :text:      str     Raw mask, e.g. `a/b(c,d/e)`
+
+    :returns:   tuple   (depth, nodes) where `depth` is the longest path,
+                        4 above, and `nodes` the number of field names, 5
+    """
+    stack = []
+    base = 0
+    depth = max_depth = nodes = 1
+    for char in text:
+        if char == '/':
+            depth += 1
+        elif char == '(':
+            stack.append(base)
+            base = depth
+            depth += 1
+        elif char == ',':
+            depth = base + 1
+        elif char == ')':
+            base = stack.pop() if stack else 0
+            continue
+        else:
+            continue
+        nodes += 1
+        max_depth = max(max_depth, depth)
+    return max_depth, nodes
+
+
+def check_mask_complexity(text):
+    max_depth = get_mask_limit('MAX_MASK_DEPTH')
+    max_nodes = get_mask_limit('MAX_MASK_NODES')
+    if max_depth is None and max_nodes is None:
+        return
+
+    depth, nodes = measure_mask(text)
+    if max_depth is not None and depth > max_depth:
+        raise exceptions.ParseError(
+            'Field mask is too deep (%d levels, at most %d allowed)' % (depth, max_depth,)
+        )
+    if max_nodes is not None and nodes > max_nodes:
+        raise exceptions.ParseError(
+            'Field mask is too large (%d fields, at most %d allowed)' % (nodes, max_nodes,)
+        )
+
+
+def split_mask(text):
+    """
+    :text:      str     Raw mask, e.g. `a,b(c,d),@summary`
 
-from . import constants
+    :returns:   list    Its top-level, comma separated terms
+    """
+    terms = []
+    depth = 0
+    start = 0
+    for index, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            terms.append(text[start:index])
+            start = index + 1
+    terms.append(text[start:])
+    return [term for term in terms if term]
+
+
+def merge_masks(*masks):
+    """
+    Union of several parsed masks. A leaf (which stands for "everything
+    below here") absorbs any narrower structure for the same key.
+
+    :returns:   dict
+    """
+    merged = {}
+    for mask in masks:
+        for key, value in (mask or {}).items():
+            if key not in merged:
+                merged[key] = value
+            elif not merged[key] or not value:
+                merged[key] = {}
+            else:
+                merged[key] = merge_masks(merged[key], value)
+    return merged
+
+
+def compile_presets(presets):
+    """
+    :presets:   dict        Preset name -> raw mask, e.g.
+                            `{'summary': 'id,title,author/username'}`
+
+    :returns:   FrozenMask  Preset name -> parsed mask, or None
+    """
+    if not presets:
+        return None
+    if isinstance(presets, FrozenMask):
+        return presets
+    return FrozenMask(dict(
+        (name, parse_mask(text) or {}) for name, text in presets.items()
+    ))
+
+
+def parse_mask(text, presets=None):
+    """
+    Cached equivalent of `jsonmask.parse_fields`, which also resolves
+    `@name` terms against `presets`
+
+    :text:      str             Raw `?fields=` or `?excludes=` value
+    :presets:   FrozenMask      As returned by `compile_presets`
+
+    :returns:   FrozenMask      Or None, if `text` was empty
+    """
+    if not text:
+        return None
+
+    instrumented = signals.has_listeners(signals.mask_parsed)
+    if instrumented:
+        start = default_timer()
 
+    check_mask_length(text)
 
-def extract_json_mask_from_request(request):
+    has_presets = constants.PRESET_PREFIX in text
+    key = (text, presets) if has_presets else text
+
+    cache = get_mask_cache()
+    mask = cache.get(key)
+    cached = mask is not None
+    if mask is None:
+        check_mask_complexity(text)
+        if has_presets:
+            mask = FrozenMask(resolve_presets(text, presets))
+        else:
+            mask = FrozenMask(parse_fields(text))
+        cache.set(key, mask)
+
+    if instrumented:
+        signals.mask_parsed.send(
+            sender=None, text=text, fingerprint=mask.fingerprint, cached=cached,
+            duration=default_timer() - start,
+        )
+    return mask
+
+
+def resolve_presets(text, presets):
+    terms = []
+    preset_masks = []
+    for term in split_mask(text):
+        if not term.startswith(constants.PRESET_PREFIX):
+            terms.append(term)
+            continue
+        name = term[len(constants.PRESET_PREFIX):]
+        if not presets or name not in presets:
+            raise exceptions.ParseError('Unknown field preset `%s`' % term)
+        preset_masks.append(presets[name])
+
+    return merge_masks(parse_fields(','.join(terms)), *preset_masks)
+
+
+def extract_json_mask_from_request(request, presets=None):
     includes, excludes = {}, {}
 
     excludes_name = getattr(settings, 'REST_FRAMEWORK_JSONMASK_EXCLUDES_NAME', constants.EXCLUDES_NAME)
     fields_name = getattr(settings, 'REST_FRAMEWORK_JSONMASK_FIELDS_NAME', constants.FIELDS_NAME)
 
+    presets = compile_presets(presets)
     if fields_name in request.GET:
-        includes = parse_fields(request.GET[fields_name])
+        includes = parse_mask(request.GET[fields_name], presets) or {}
     if excludes_name in request.GET:
-        excludes = parse_fields(request.GET[excludes_name])
+        excludes = parse_mask(request.GET[excludes_name], presets) or {}
 
     if includes and excludes:
         raise ValueError('Cannot supply both `%s` and `%s`' % (fields_name, excludes_name,))
@@ -23,10 +265,32 @@ def extract_json_mask_from_request(request):
     return includes, excludes
 
 
-def apply_json_mask_from_request(data, request):
-    includes, excludes = extract_json_mask_from_request(request)
+def apply_json_mask_from_request(data, request, presets=None, in_place=False):
+    """
+    :in_place:  bool    Prune `data` itself rather than a copy of it. Only
+                        safe for data built for this response alone
+
+    :returns:   dict    `data`, masked by the request's `fields` or `excludes`
+    """
+    from .maskers import compile_mask
+
+    includes, excludes = extract_json_mask_from_request(request, presets)
+    json_mask, is_negated = collapse_includes_excludes(includes, excludes)
+    return compile_mask(json_mask, is_negated)(data, in_place=in_place)
+
+
+def iter_json_mask_from_request(rows, request, presets=None, in_place=False):
+    """
+    Like `apply_json_mask_from_request`, for an iterable of same-shaped dicts
+
+    :returns:   generator   Masked rows. The request's mask is parsed, and
+                            rejected if invalid, before this returns
+    """
+    from .maskers import compile_mask
+
+    includes, excludes = extract_json_mask_from_request(request, presets)
     json_mask, is_negated = collapse_includes_excludes(includes, excludes)
-    return apply_json_mask(data, json_mask, is_negated)
+    return compile_mask(json_mask, is_negated).iter_rows(rows, in_place=in_place)
 
 
 def collapse_includes_excludes(includes, excludes):
@@ -1,19 +1,52 @@
 from __future__ import unicode_literals
 
+from itertools import islice
+from timeit import default_timer
+
 from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django.utils import six
 from django.utils.functional import cached_property
-from jsonmask import parse_fields, should_include_variable
-from rest_framework import exceptions
+from rest_framework import exceptions, pagination
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.serializer_helpers import ReturnList
 
-from . import constants
-from .utils import collapse_includes_excludes
+from . import constants, signals
+from .cache import get_cache
+from .codegen import get_values_function
+from .debug import LazyLoadDetector
+from .planning import (
+    ColumnPlan, PredicateTrie, RelationPlan, build_masked_prefetch,
+    normalize_prefetch_lookups,
+)
+from .projection import JSONProjection
+from .response_cache import (
+    get_model_versions, get_response_cache_key, get_serializer_models,
+    register_models,
+)
+from .serializers import has_default_representation
+from .utils import (
+    FrozenMask, collapse_includes_excludes, compile_presets, get_mask_limit,
+    parse_mask,
+)
 
 
 class OptimizedQuerySetBase(type):
     def __new__(cls, name, bases, attrs):
         new_cls = super(OptimizedQuerySetBase, cls).__new__(cls, name, bases, attrs)
         new_cls._data_predicates = new_cls.extract_data_predicates(attrs)
+        new_cls._data_annotations = new_cls.extract_data_annotations(attrs)
+        new_cls._predicate_trie = PredicateTrie.build(
+            new_cls._data_predicates, new_cls._data_annotations,
+        )
+        new_cls._field_presets = new_cls.extract_field_presets()
+        new_cls._response_cache_models = new_cls.extract_response_cache_models()
         return new_cls
 
     def extract_data_predicates(cls, attrs):
@@ -24,6 +57,49 @@ class OptimizedQuerySetBase(type):
                     data_predicates[data_function_predicate] = value
         return data_predicates
 
+    def extract_data_annotations(cls, attrs):
+        data_annotations = {}
+        for key, value in attrs.items():
+            field_name = getattr(value, '_data_annotation_field_name', None)
+            if field_name is None:
+                continue
+            if '.' in field_name:
+                raise ImproperlyConfigured(
+                    '%s.%s: data annotations only apply to top level fields, not `%s`' % (
+                        cls.__name__, key, field_name,
+                    )
+                )
+            data_annotations[field_name] = value
+        return data_annotations
+
+    def extract_response_cache_models(cls):
+        """
+        :returns:   tuple   Labels of the models whose changes invalidate
+                            this view's cached responses, now registered
+                            for invalidation
+        """
+        if getattr(cls, 'response_cache_timeout', None) is None:
+            return ()
+        models = set(cls.response_cache_models)
+        queryset = getattr(cls, 'queryset', None)
+        if queryset is not None:
+            models.add(queryset.model)
+        serializer_class = getattr(cls, 'serializer_class', None)
+        if serializer_class is not None:
+            models.update(get_serializer_models(serializer_class))
+        return register_models(models, cls.response_cache_alias)
+
+    def extract_field_presets(cls):
+        """
+        :returns:   FrozenMask  The `field_presets` of `serializer_class`,
+                                overridden by those declared along this
+                                class's MRO, subclasses taking precedence
+        """
+        presets = dict(getattr(getattr(cls, 'serializer_class', None), 'field_presets', None) or {})
+        for base in reversed(cls.__mro__):
+            presets.update(base.__dict__.get('field_presets') or {})
+        return compile_presets(presets)
+
 
 @six.add_metaclass(OptimizedQuerySetBase)
 class OptimizedQuerySetMixin(object):
@@ -31,6 +107,82 @@ class OptimizedQuerySetMixin(object):
     Allows a Google Partial Response query param like to prune results
     """
 
+    # Mask applied when the client sends neither `fields` nor `excludes`.
+    # Clients can still ask for everything with `?fields=*`
+    default_fields = None
+
+    # Named masks clients can refer to as `?fields=@name`, e.g.
+    # `{'summary': 'id,title,author/username'}`. Merged over any
+    # `field_presets` declared on `serializer_class`
+    field_presets = None
+
+    # Add `select_related` / `prefetch_related` lookups for nested
+    # serializers that no `data_predicate` covers
+    infer_related = True
+
+    # Restrict loaded columns to those the masked serializer will read
+    prune_columns = True
+
+    # Write unpaginated `list` responses incrementally, loading and
+    # serializing `stream_chunk_size` rows at a time
+    stream_list = False
+    stream_chunk_size = 1000
+
+    # Serve `list` from `queryset.values()`, without creating model
+    # instances, when every field that survives the mask is a plain column
+    values_fast_path = True
+
+    # Have the database build each row's JSON, including nested
+    # serializers over foreign keys and reverse foreign keys, falling back
+    # to Python for fields it cannot express
+    json_projection = False
+
+    # Cache `list` and `retrieve` responses for this many seconds in the
+    # `response_cache_alias` cache. Entries are keyed by view, URL kwargs,
+    # query parameters, mask and user, and invalidated when the view's
+    # model, those of its nested serializers or `response_cache_models`
+    # are saved or deleted
+    response_cache_timeout = None
+    response_cache_alias = 'default'
+    response_cache_models = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        lazy_loads = getattr(settings, 'REST_FRAMEWORK_JSONMASK_LAZY_LOADS', None)
+        if lazy_loads is None or not hasattr(connection, 'execute_wrapper'):
+            return self.instrumented_dispatch(request, *args, **kwargs)
+
+        detector = LazyLoadDetector()
+        with connection.execute_wrapper(detector):
+            response = self.instrumented_dispatch(request, *args, **kwargs)
+        detector.report(self, lazy_loads)
+        return response
+
+    def instrumented_dispatch(self, request, *args, **kwargs):
+        if not signals.has_listeners(signals.request_masked, self.__class__):
+            return super(OptimizedQuerySetMixin, self).dispatch(request, *args, **kwargs)
+
+        counter = QueryCounter()
+        start = default_timer()
+        if hasattr(connection, 'execute_wrapper'):
+            with connection.execute_wrapper(counter):
+                response = super(OptimizedQuerySetMixin, self).dispatch(request, *args, **kwargs)
+            queries = counter.count
+        else:
+            response = super(OptimizedQuerySetMixin, self).dispatch(request, *args, **kwargs)
+            queries = None
+        duration = default_timer() - start
+
+        try:
+            fingerprint, is_negated = self.get_mask_fingerprint()
+        except exceptions.APIException:
+            # The mask was rejected; `response` says why
+            fingerprint, is_negated = None, False
+        signals.request_masked.send(
+            sender=self.__class__, view=self, request=self.request, response=response,
+            fingerprint=fingerprint, is_negated=is_negated, queries=queries, duration=duration,
+        )
+        return response
+
     def get_serializer_context(self):
         context = super(OptimizedQuerySetMixin, self).get_serializer_context()
 
@@ -42,47 +194,445 @@ class OptimizedQuerySetMixin(object):
                 detail='Cannot provide both "%s" and "%s"' % (fields_name, excludes_name,)
             )
 
-        if fields_name in self.request.GET:
+        if fields_name in self.request.GET or self.uses_default_fields:
             context['requested_fields'] = self.requested_fields
         elif excludes_name in self.request.GET:
             context['excluded_fields'] = self.excluded_fields
 
         return context
 
+    @cached_property
+    def uses_default_fields(self):
+        """
+        True if `default_fields` stands in for a mask the client did not send
+        """
+        fields_name = getattr(settings, 'REST_FRAMEWORK_JSONMASK_FIELDS_NAME', constants.FIELDS_NAME)
+        excludes_name = getattr(settings, 'REST_FRAMEWORK_JSONMASK_EXCLUDES_NAME', constants.EXCLUDES_NAME)
+        return bool(self.default_fields) and not (
+            fields_name in self.request.GET or excludes_name in self.request.GET
+        )
+
+    @cached_property
+    def prunes_columns(self):
+        """
+        True if `prune_columns` applies to this request. Instances loaded
+        for writes keep every column, since `save()` only writes those
+        loaded, e.g. skipping `auto_now` fields
+        """
+        return self.prune_columns and self.request.method in SAFE_METHODS
+
     @cached_property
     def requested_fields(self):
+        if self.uses_default_fields:
+            return parse_mask(self.default_fields, self._field_presets)
         fields_name = getattr(settings, 'REST_FRAMEWORK_JSONMASK_FIELDS_NAME', constants.FIELDS_NAME)
-        return parse_fields(self.request.GET.get(fields_name))
+        return parse_mask(self.request.GET.get(fields_name), self._field_presets)
 
     @cached_property
     def excluded_fields(self):
         excludes_name = getattr(settings, 'REST_FRAMEWORK_JSONMASK_EXCLUDES_NAME', constants.EXCLUDES_NAME)
-        return parse_fields(self.request.GET.get(excludes_name))
+        return parse_mask(self.request.GET.get(excludes_name), self._field_presets)
 
     def optimize_queryset(self, queryset):
+        """
+        Add what the mask calls for, and only that, to `queryset`
+
+        Like the data predicates and annotations it calls, this only builds
+        the queryset; no query runs until it is evaluated.
+        """
+        if signals.has_listeners(signals.queryset_optimized, self.__class__):
+            start = default_timer()
+            queryset = self.build_optimized_queryset(queryset)
+            fingerprint, is_negated = self.get_mask_fingerprint()
+            signals.queryset_optimized.send(
+                sender=self.__class__, view=self, fingerprint=fingerprint, is_negated=is_negated,
+                data_functions=[
+                    getattr(data_function, '__name__', repr(data_function))
+                    for data_function in self.get_data_functions(self.requested_fields, self.excluded_fields)
+                ],
+                duration=default_timer() - start,
+            )
+            return queryset
+        return self.build_optimized_queryset(queryset)
+
+    def build_optimized_queryset(self, queryset):
         if self.requested_fields and self.excluded_fields:
             raise exceptions.ParseError('Cannot provide both `fields` and `excludes`')
 
         if self.requested_fields or self.excluded_fields:
-            return self.apply_requested_data_functions(
+            queryset = self.apply_requested_data_functions(
                 queryset, self.requested_fields, self.excluded_fields
             )
-        return self.apply_all_data_functions(queryset)
+        else:
+            queryset = self.apply_all_data_functions(queryset)
+
+        queryset = self.apply_serializer_plan(
+            queryset, self.requested_fields, self.excluded_fields
+        )
+        return normalize_prefetch_lookups(queryset)
+
+    def get_mask_fingerprint(self):
+        """
+        :returns:   tuple   (fingerprint of the mask in use, or None,
+                            is_negated,)
+        """
+        structure, is_negated = collapse_includes_excludes(self.requested_fields, self.excluded_fields)
+        if not structure:
+            return None, False
+        return structure.fingerprint, is_negated
+
+    def get_data_functions(self, fields, excludes):
+        """
+        :returns:   list    Data predicates and annotations the mask calls for,
+                            or all of them if there is no mask
+        """
+        if not fields and not excludes:
+            return self._predicate_trie.all()
+        requested_structure, is_negated = collapse_includes_excludes(fields, excludes)
+        return self._predicate_trie.match(requested_structure, is_negated)
 
     def apply_requested_data_functions(self, queryset, fields, excludes):
+        data_functions = self.get_data_functions(fields, excludes)
+        if not self.uses_default_fields:
+            self.check_related_data(queryset, data_functions, fields, excludes)
+
+        for data_function in data_functions:
+            queryset = data_function(self, queryset)
+        return queryset
+
+    def check_related_data(self, queryset, data_functions, fields, excludes):
+        """
+        Enforce `MAX_MASK_PREDICATES` on a client's mask, counting the data
+        functions it triggers and the prefetches inferred for it
+        """
+        max_predicates = get_mask_limit('MAX_MASK_PREDICATES')
+        if max_predicates is None:
+            return
+
+        count = len(data_functions)
+        if self.infer_related:
+            requested_structure, is_negated = collapse_includes_excludes(fields, excludes)
+            relation_plan, _ = self.get_serializer_plan(queryset.model, requested_structure, is_negated)
+            count += relation_plan.count_prefetches()
+
+        if count > max_predicates:
+            raise exceptions.ParseError(
+                'Field mask requests too much related data (%d data functions and prefetches, '
+                'at most %d allowed)' % (count, max_predicates,)
+            )
+
+    def apply_serializer_plan(self, queryset, fields, excludes):
+        if not self.infer_related and not self.prunes_columns:
+            return queryset
+
         requested_structure, is_negated = collapse_includes_excludes(fields, excludes)
-        for dotted_path, data_function in self._data_predicates.items():
-            if should_include_variable(
-                dotted_path, requested_structure, is_negated=is_negated
-            ):
-                queryset = data_function(self, queryset)
+        relation_plan, column_plan = self.get_serializer_plan(
+            queryset.model, requested_structure, is_negated,
+        )
+
+        if relation_plan is not None:
+            queryset = relation_plan.apply(queryset)
+        if column_plan is not None:
+            queryset = column_plan.apply(queryset)
         return queryset
 
+    def get_serializer_plan(self, model, structure, is_negated):
+        """
+        :returns:   tuple   (RelationPlan, ColumnPlan) for this view's
+                            serializer pruned by `structure`. Either may be
+                            None if `infer_related` / `prune_columns` is off.
+                            Plans are cached per view, serializer and mask,
+                            so repeated masks skip walking the serializer
+        """
+        cache = get_cache('REST_FRAMEWORK_JSONMASK_PLAN_CACHE_SIZE', constants.PLAN_CACHE_SIZE)
+        key = (
+            self.__class__, self.get_serializer_class(), model,
+            structure or None, is_negated, self.infer_related, self.prunes_columns,
+        )
+        try:
+            plans = cache.get(key)
+        except TypeError:
+            # Unhashable mask, e.g. a hand-built dict; plan without caching
+            key, plans = None, None
+
+        if plans is None:
+            plans = self.build_serializer_plan(model, structure, is_negated)
+            if key is not None:
+                cache.set(key, plans)
+        return plans
+
+    def build_serializer_plan(self, model, structure, is_negated):
+        serializer = self.get_serializer()
+        relation_plan = column_plan = None
+
+        if self.infer_related:
+            relation_plan = RelationPlan.build(
+                serializer, model, structure, is_negated,
+                covered=self._data_predicates, prune_columns=self.prunes_columns,
+            )
+        if self.prunes_columns:
+            column_plan = ColumnPlan.build(serializer, model, structure, is_negated)
+        return relation_plan, column_plan
+
+    def get_masked_prefetch(self, queryset, dotted_path):
+        """
+        For use inside data predicates, e.g.
+
+            @data_predicate('comments')
+            def load_comments(self, queryset):
+                return queryset.prefetch_related(
+                    self.get_masked_prefetch(queryset, 'comments')
+                )
+
+        :returns:   Prefetch    For the relation behind the nested serializer
+                                at `dotted_path`, whose queryset only loads
+                                what this request's mask asks for
+        """
+        requested_structure, is_negated = collapse_includes_excludes(
+            self.requested_fields, self.excluded_fields,
+        )
+        return build_masked_prefetch(
+            self.get_serializer(), queryset.model, dotted_path, requested_structure, is_negated,
+            covered=self._data_predicates, prune_columns=self.prunes_columns,
+        )
+
     def apply_all_data_functions(self, queryset):
-        for _, data_function in self._data_predicates.items():
+        for data_function in self._predicate_trie.all():
             queryset = data_function(self, queryset)
         return queryset
 
     def get_queryset(self):
         queryset = super(OptimizedQuerySetMixin, self).get_queryset()
         return self.optimize_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(self.build_list_response, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super(OptimizedQuerySetMixin, self).retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        """
+        :handler:   callable    Builds the response on a cache miss
+
+        :returns:   Response    From the response cache, if enabled and it
+                                holds one, or else from `handler`
+        """
+        if self.response_cache_timeout is None:
+            return handler(request, *args, **kwargs)
+
+        cache = caches[self.response_cache_alias]
+        cache_key = self.get_response_cache_key(request, cache)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            data, status_code = cached
+            return Response(data, status=status_code)
+
+        response = handler(request, *args, **kwargs)
+        # Streamed, failed and redirected responses are not cached
+        if isinstance(response, Response) and response.status_code == 200 and not response.exception:
+            cache.set(cache_key, (response.data, response.status_code,), self.response_cache_timeout)
+        return response
+
+    def get_response_cache_key(self, request, cache):
+        """
+        :returns:   str     Cache key for this request's response. The mask
+                            is included in full, in canonical form, so
+                            `?fields=b,a` and `?fields=a,b` share an entry
+                            but different masks never do
+        """
+        fields_name = getattr(settings, 'REST_FRAMEWORK_JSONMASK_FIELDS_NAME', constants.FIELDS_NAME)
+        excludes_name = getattr(settings, 'REST_FRAMEWORK_JSONMASK_EXCLUDES_NAME', constants.EXCLUDES_NAME)
+        structure, is_negated = collapse_includes_excludes(self.requested_fields, self.excluded_fields)
+        user = getattr(request, 'user', None)
+
+        return get_response_cache_key([
+            self.__class__.__module__, self.__class__.__name__, getattr(self, 'action', None),
+            sorted(self.kwargs.items()),
+            sorted(
+                (key, values) for key, values in request.query_params.lists()
+                if key not in (fields_name, excludes_name)
+            ),
+            FrozenMask(structure).to_text() if structure else None,
+            bool(structure) and is_negated,
+            user.pk if user is not None and user.is_authenticated else None,
+            get_model_versions(cache, self._response_cache_models),
+        ])
+
+    def build_list_response(self, request, *args, **kwargs):
+        if self.stream_list and self.paginator is None and self.accepts_json(request):
+            queryset = self.filter_queryset(self.get_queryset())
+            serializer = self.get_serializer(queryset, many=True)
+            return StreamingHttpResponse(
+                self.stream_json(serializer.child, queryset),
+                content_type=request.accepted_renderer.media_type,
+            )
+
+        if self.values_fast_path:
+            response = self.list_values()
+            if response is not None:
+                return response
+
+        if self.json_projection:
+            response = self.list_json_projection()
+            if response is not None:
+                return response
+
+        return super(OptimizedQuerySetMixin, self).list(request, *args, **kwargs)
+
+    def accepts_json(self, request):
+        # False for e.g. the browsable API
+        return isinstance(getattr(request, 'accepted_renderer', None), JSONRenderer)
+
+    def list_values(self):
+        """
+        :returns:   Response    Serialized from `queryset.values()`, or None
+                                if the masked serializer reads anything
+                                other than plain model columns, the
+                                queryset is `distinct()` or the paginator
+                                is neither page number nor limit/offset
+        """
+        paginator = self.paginator
+        if paginator is not None and not isinstance(
+            paginator, (pagination.PageNumberPagination, pagination.LimitOffsetPagination)
+        ):
+            return None
+
+        serializer = self.get_serializer()
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        representation_function, columns = self.get_values_representation(serializer, model)
+        if representation_function is None:
+            return None
+
+        queryset = self.get_queryset()
+        if queryset.model is not model:
+            return None
+
+        queryset = self.filter_queryset(queryset)
+        if queryset.query.distinct:
+            # Rows would be distinct over the masked columns only
+            return None
+
+        queryset = queryset.prefetch_related(None).values(*self.get_values_columns(model, columns))
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+
+        fields = serializer._readable_fields
+        data = ReturnList(
+            [representation_function(row, fields) for row in rows],
+            serializer=self.get_serializer(many=True),
+        )
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def get_values_columns(self, model, columns):
+        """
+        :columns:   list    Columns the masked serializer reads
+
+        :returns:   list    `columns`, plus the primary key and any column
+                            the paginator orders by, which the
+                            representation function leaves out
+        """
+        columns = list(columns)
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, six.string_types):
+            ordering = (ordering,)
+        for name in (model._meta.pk.attname,) + tuple(name.lstrip('-') for name in ordering):
+            if name not in columns:
+                columns.append(name)
+        return columns
+
+    def list_json_projection(self):
+        """
+        :returns:   Response    Serialized, as far as possible, by the
+                                database, or None if no field can be
+        """
+        serializer = self.get_serializer()
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        if model is None:
+            return None
+        projection = JSONProjection.build(serializer, model)
+        if projection is None:
+            return None
+
+        queryset = self.get_queryset()
+        if queryset.model is not model:
+            return None
+
+        queryset = projection.apply(self.filter_queryset(queryset))
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+
+        data = ReturnList(
+            [projection.to_representation(row) for row in rows],
+            serializer=self.get_serializer(many=True),
+        )
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def get_values_representation(self, serializer, model):
+        """
+        :returns:   tuple   As `codegen.get_values_function`, or (None, None)
+                            if `serializer` customizes its representation
+        """
+        if model is None or not has_default_representation(serializer):
+            return None, None
+        return get_values_function(serializer.__class__, model, serializer._readable_fields)
+
+    def stream_json(self, serializer, queryset):
+        """
+        :serializer:    Serializer  A single, already masked, item serializer
+        :queryset:      QuerySet    Optimized queryset to serialize
+
+        :returns:       generator   Bytes of a JSON array, one chunk of rows
+                                    at a time
+        """
+        renderer = self.request.accepted_renderer
+        renderer_context = self.get_renderer_context()
+        media_type = self.request.accepted_media_type
+
+        yield b'['
+        separator = b''
+        for chunk in iter_prefetched_chunks(queryset, self.stream_chunk_size):
+            rendered = [
+                renderer.render(serializer.to_representation(instance), media_type, renderer_context)
+                for instance in chunk
+            ]
+            yield separator + b','.join(rendered)
+            separator = b','
+        yield b']'
+
+
+class QueryCounter(object):
+    """
+    Database execute wrapper counting the queries run through it
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def iter_prefetched_chunks(queryset, chunk_size):
+    """
+    Iterate `queryset` without caching its results, running its
+    `prefetch_related` lookups for `chunk_size` instances at a time
+
+    :returns:   generator   Lists of model instances
+    """
+    lookups = queryset._prefetch_related_lookups
+    instances = queryset.prefetch_related(None).iterator()
+    while True:
+        chunk = list(islice(instances, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            prefetch_related_objects(chunk, *lookups)
+        yield chunk
@@ -52,3 +52,12 @@ class Comment(BaseModel):
 
     def __str__(self):
         return self.body[:50]
+
+
+@python_2_unicode_compatible
+class Attachment(BaseModel):
+    name = models.CharField(max_length=255)
+    file = models.FileField(upload_to='attachments', blank=True)
+
+    def __str__(self):
+        return self.name
@@ -2,9 +2,10 @@ from __future__ import unicode_literals
 
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_jsonmask.decorators import data_dependencies
 from rest_framework_jsonmask.serializers import FieldsListSerializerMixin
 
-from .models import Comment, Ticket
+from .models import Attachment, Comment, Ticket
 
 
 class UserSerializer(FieldsListSerializerMixin, serializers.ModelSerializer):
@@ -31,3 +32,75 @@ class TicketSerializer(FieldsListSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = ('title', 'body', 'author', 'comments',)
+
+
+class AnnotatedTicketSerializer(TicketSerializer):
+
+    comment_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TicketSerializer.Meta):
+        fields = TicketSerializer.Meta.fields + ('comment_count',)
+
+
+class PresetTicketSerializer(TicketSerializer):
+
+    field_presets = {
+        'bodies': 'body,comments/body',
+    }
+
+
+class CommentersTicketSerializer(TicketSerializer):
+
+    commenters = serializers.SerializerMethodField()
+
+    class Meta(TicketSerializer.Meta):
+        fields = TicketSerializer.Meta.fields + ('commenters',)
+
+    @data_dependencies('comments__author')
+    def get_commenters(self, obj):
+        return sorted(set(comment.author.username for comment in obj.comments.all()))
+
+
+class CompiledUserSerializer(UserSerializer):
+    compile_representation = True
+
+
+class CompiledCommentSerializer(CommentSerializer):
+    compile_representation = True
+
+    author = CompiledUserSerializer()
+
+    class Meta(CommentSerializer.Meta):
+        fields = ('id', 'ticket',) + CommentSerializer.Meta.fields
+
+
+class CompiledTicketSerializer(TicketSerializer):
+    compile_representation = True
+
+    author = CompiledUserSerializer(allow_null=True)
+    comments = CompiledCommentSerializer(many=True)
+
+    class Meta(TicketSerializer.Meta):
+        fields = ('id', 'created_at',) + TicketSerializer.Meta.fields
+
+
+class MemoizedUserSerializer(UserSerializer):
+    memoize_representation = True
+
+
+class MemoizedCommentSerializer(CommentSerializer):
+
+    author = MemoizedUserSerializer(allow_null=True)
+
+
+class MemoizedTicketSerializer(TicketSerializer):
+
+    author = MemoizedUserSerializer(allow_null=True)
+    comments = MemoizedCommentSerializer(many=True)
+
+
+class AttachmentSerializer(FieldsListSerializerMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Attachment
+        fields = ('name', 'file',)
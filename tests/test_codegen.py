@@ -0,0 +1,65 @@
+from __future__ import unicode_literals
+
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework_jsonmask.codegen import (
+    DELEGATE, INTEGER, TEXT, VALUE, get_representation_signature,
+)
+
+from . import factories
+from .models import Ticket
+from .serializers import (
+    CompiledCommentSerializer, CompiledTicketSerializer,
+    CompiledUserSerializer,
+)
+
+COMPILED_SERIALIZERS = (CompiledTicketSerializer, CompiledCommentSerializer, CompiledUserSerializer)
+
+
+class TestCompiledRepresentation(TestCase):
+
+    def setUp(self):
+        self.ticket = factories.TicketFactory()
+        factories.CommentFactory(ticket=self.ticket)
+        factories.CommentFactory(ticket=self.ticket, author=None)
+        factories.TicketFactory(author=None)
+
+    def tearDown(self):
+        for serializer_class in COMPILED_SERIALIZERS:
+            serializer_class.compile_representation = True
+
+    def render(self, context, compiled):
+        for serializer_class in COMPILED_SERIALIZERS:
+            serializer_class.compile_representation = compiled
+        serializer = CompiledTicketSerializer(Ticket.objects.order_by('pk'), many=True, context=context)
+        return JSONRenderer().render(serializer.data)
+
+    def test_identical_output(self):
+        contexts = [
+            {},
+            {'requested_fields': 'id,title,comments/ticket'},
+            {'requested_fields': 'author/email,comments(author)'},
+            {'excluded_fields': 'body,comments/author/email'},
+        ]
+        for context in contexts:
+            self.assertEqual(self.render(context, True), self.render(context, False), context)
+
+    def test_signature(self):
+        serializer = CompiledTicketSerializer(self.ticket)
+        self.assertEqual(get_representation_signature(Ticket, serializer._readable_fields), (
+            ('id', INTEGER, 'id'),
+            ('created_at', VALUE, 'created_at'),
+            ('title', TEXT, 'title'),
+            ('body', TEXT, 'body'),
+            ('author', DELEGATE, None),
+            ('comments', DELEGATE, None),
+        ))
+
+    def test_uses_generated_function(self):
+        serializer = CompiledTicketSerializer(self.ticket, context={'requested_fields': 'title'})
+        self.assertIsNotNone(serializer._representation_function)
+        self.assertEqual(serializer.data, {'title': self.ticket.title})
+
+    def test_not_a_model_instance(self):
+        serializer = CompiledTicketSerializer({'title': 'x'}, context={'requested_fields': 'title'})
+        self.assertEqual(serializer.data, {'title': 'x'})
@@ -0,0 +1,56 @@
+from __future__ import unicode_literals
+
+import warnings
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework_jsonmask.debug import LazyLoadError, LazyLoadWarning
+
+from . import factories
+
+
+@override_settings(REST_FRAMEWORK_JSONMASK_LAZY_LOADS='raise')
+class TestLazyLoadDetection(TestCase):
+
+    def setUp(self):
+        for _ in range(2):
+            ticket = factories.TicketFactory()
+            factories.CommentFactory(ticket=ticket)
+
+    def get_error(self, url_name, query):
+        with self.assertRaises(LazyLoadError) as context:
+            self.client.get(reverse(url_name) + query)
+        return str(context.exception)
+
+    def test_missing_predicate(self):
+        message = self.get_error('lazy-ticket-list', '?fields=comments/author/username')
+        self.assertIn('LazyTicketViewSet: `comments/author` was loaded lazily, by 2 queries', message)
+        self.assertIn("add `@data_predicate('comments.author')`", message)
+
+    def test_predicate_did_not_load(self):
+        message = self.get_error('lazy-ticket-list', '?fields=author')
+        self.assertIn('`author` was loaded lazily', message)
+        self.assertIn('The data predicate `load_author` for `author` was applied, but did not load it', message)
+
+    def test_method_field(self):
+        message = self.get_error('lazy-ticket-list', '?fields=commenters')
+        self.assertIn('`commenters` was loaded lazily', message)
+        self.assertIn('Declare what `get_commenters` reads with `@data_dependencies`', message)
+
+    def test_covered(self):
+        for url_name in ('ticket-list', 'inferred-ticket-list', 'commenters-ticket-list'):
+            for query in ('', '?fields=title,comments/author/username', '?excludes=comments/body'):
+                resp = self.client.get(reverse(url_name) + query)
+                self.assertEqual(resp.status_code, 200)
+
+        resp = self.client.get(reverse('lazy-ticket-list') + '?fields=title,comments/body')
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_LAZY_LOADS='warn')
+    def test_warn(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            resp = self.client.get(reverse('lazy-ticket-list') + '?fields=author,comments/author')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([warning.category for warning in caught], [LazyLoadWarning, LazyLoadWarning])
@@ -1,7 +1,14 @@
 from __future__ import unicode_literals
 
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from rest_framework_jsonmask.cache import get_cache
+from rest_framework_jsonmask.serializers import MaskedContext
+from rest_framework_jsonmask.utils import parse_mask
+
+from . import factories
+from .models import Ticket
+from .serializers import MemoizedTicketSerializer, TicketSerializer
 
 
 class TestRawFieldPruning(TestCase):
@@ -38,3 +45,104 @@ class TestRawFieldPruning(TestCase):
         }
 
         assert expected == response.json()
+
+
+class TestMaskedContext(TestCase):
+
+    def test_nested_contexts_share_root(self):
+        ticket = factories.TicketFactory()
+        factories.CommentFactory(ticket=ticket)
+        context = {'requested_fields': 'title,comments/author/username', 'extra': 1}
+        serializer = TicketSerializer(ticket, context=context)
+
+        fields = dict((field.field_name, field) for field in serializer._readable_fields)
+        comments = fields['comments'].child
+        author = dict((field.field_name, field) for field in comments._readable_fields)['author']
+
+        self.assertIsInstance(author._context, MaskedContext)
+        self.assertIs(author._context.context, context)
+        self.assertEqual(author._context['requested_fields'], {'username': {}})
+        self.assertIsNone(author._context['excluded_fields'])
+        self.assertEqual(author._context['extra'], 1)
+        self.assertIs(comments._context, fields['comments']._context)
+
+    def test_read_only(self):
+        masked = MaskedContext({'extra': 1}, parse_mask('a'))
+        with self.assertRaises(TypeError):
+            masked['extra'] = 2
+
+        copied = masked.copy()
+        copied['extra'] = 2
+        self.assertEqual(copied, {'extra': 2, 'requested_fields': {'a': {}}, 'excluded_fields': None})
+
+
+class TestFieldPlans(TestCase):
+
+    def setUp(self):
+        self.ticket = factories.TicketFactory()
+        factories.CommentFactory(ticket=self.ticket)
+        get_cache('REST_FRAMEWORK_JSONMASK_FIELD_PLAN_CACHE_SIZE', None).clear()
+
+    def test_only_surviving_fields_built(self):
+        serializer = TicketSerializer(self.ticket, context={'requested_fields': 'title,comments/body'})
+        serializer.data
+
+        self.assertEqual(list(serializer.fields), ['title', 'comments'])
+        self.assertEqual(list(serializer.fields['comments'].child.fields), ['body'])
+        self.assertEqual(set(serializer.get_all_fields()), {'title', 'body', 'author', 'comments'})
+
+    def test_excludes(self):
+        serializer = TicketSerializer(self.ticket, context={'excluded_fields': 'body,comments/author'})
+        serializer.data
+
+        self.assertEqual(list(serializer.fields), ['title', 'author', 'comments'])
+        self.assertEqual(list(serializer.fields['comments'].child.fields), ['body'])
+
+    def test_plans_cached(self):
+        for _ in range(3):
+            TicketSerializer(self.ticket, context={'requested_fields': 'title'}).data
+
+        info = get_cache('REST_FRAMEWORK_JSONMASK_FIELD_PLAN_CACHE_SIZE', None).info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
+
+    def test_all_fields_built_for_data(self):
+        serializer = TicketSerializer(data={}, context={'requested_fields': 'title'})
+        self.assertEqual(set(serializer.fields), {'title', 'body', 'author', 'comments'})
+
+
+class TestRepresentationMemo(TestCase):
+
+    def setUp(self):
+        author = factories.UserFactory()
+        for _ in range(2):
+            ticket = factories.TicketFactory(author=author)
+            factories.CommentFactory(ticket=ticket, author=author)
+            factories.CommentFactory(ticket=ticket, author=None)
+
+    def get_data(self, serializer_class=MemoizedTicketSerializer, **context):
+        queryset = Ticket.objects.order_by('pk')
+        return serializer_class(queryset, many=True, context=context).data
+
+    def test_reuses_representations(self):
+        context = {'request': RequestFactory().get('/'), 'requested_fields': 'author,comments/author/username'}
+        data = self.get_data(**context)
+
+        self.assertEqual(data, self.get_data(TicketSerializer, **context))
+        self.assertIs(data[0]['author'], data[1]['author'])
+        self.assertIs(data[0]['comments'][0]['author'], data[1]['comments'][0]['author'])
+        # Under a different mask, the same user is represented separately
+        self.assertEqual(data[0]['comments'][0]['author'], {'username': data[0]['author']['username']})
+
+    def test_request_scoped(self):
+        data = self.get_data()
+        self.assertIsNot(data[0]['author'], data[1]['author'])
+
+        first = self.get_data(request=RequestFactory().get('/'))
+        second = self.get_data(request=RequestFactory().get('/'))
+        self.assertIsNot(first[0]['author'], second[0]['author'])
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_MEMO_SIZE=1)
+    def test_size_cap(self):
+        request = RequestFactory().get('/')
+        self.get_data(request=request, requested_fields='author,comments/author/username')
+        self.assertEqual(len(request._jsonmask_representations), 1)
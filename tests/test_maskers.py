@@ -0,0 +1,123 @@
+from __future__ import unicode_literals
+
+import copy
+import itertools
+
+from django.test import RequestFactory, SimpleTestCase
+from jsonmask import apply_json_mask, parse_fields
+from rest_framework.exceptions import ParseError
+from rest_framework_jsonmask.maskers import compile_mask, get_masker_cache
+from rest_framework_jsonmask.utils import (
+    FrozenMask, iter_json_mask_from_request,
+)
+
+DATA = {
+    'a': 1,
+    'b': {'a': 2, 'c': {'d': 3, 'e': [{'f': 4}]}},
+    'c': {'a': {'b': True}, 'd': None},
+    'd': [{'a': 1}],
+    'e.f': 5,
+    '*': {'a': 6, 'b': 7},
+}
+
+MASKS = [
+    '', 'a', 'b', 'b/a', 'b(a,c/d)', 'b/c/e', 'c/a/b', '*', '*/a', 'b/*',
+    'b/*/d', 'a,c/*', 'z', 'b/z', 'd/a', 'e.f', 'e', 'c(a/*)', '*/*',
+]
+
+
+class TestCompiledMask(SimpleTestCase):
+
+    def setUp(self):
+        get_masker_cache().clear()
+
+    def test_matches_apply_json_mask(self):
+        for mask, is_negated in itertools.product(MASKS, (False, True,)):
+            structure = parse_fields(mask) if mask else {}
+            expected = apply_json_mask(copy.deepcopy(DATA), structure, is_negated)
+            message = '%s (is_negated=%s)' % (mask, is_negated,)
+
+            self.assertEqual(compile_mask(structure, is_negated)(DATA), expected, message)
+            self.assertEqual(
+                compile_mask(structure, is_negated)(copy.deepcopy(DATA), in_place=True),
+                expected, message,
+            )
+
+    def test_copy_leaves_data_alone(self):
+        data = copy.deepcopy(DATA)
+        compile_mask(parse_fields('b/c/d'))(data)
+        self.assertEqual(data, DATA)
+
+    def test_in_place(self):
+        data = copy.deepcopy(DATA)
+        nested = data['b']
+        masked = compile_mask(parse_fields('b/c/d'))(data, in_place=True)
+
+        self.assertIs(masked, data)
+        self.assertIs(masked['b'], nested)
+        self.assertEqual(data, {'b': {'c': {'d': 3}}})
+
+    def test_cached_by_fingerprint(self):
+        first = compile_mask(parse_fields('a,b/c'))
+        second = compile_mask(FrozenMask(parse_fields('b(c),a')))
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, compile_mask(parse_fields('a,b/c'), is_negated=True))
+
+
+class TestIterRows(SimpleTestCase):
+
+    def setUp(self):
+        self.rows = [
+            {'a': i, 'b': {'a': i, 'c': {'d': i}}, 'c': None, '*': {'a': i}}
+            for i in range(5)
+        ]
+        self.rows.insert(2, {'a': 'odd', 'b': 'shape'})
+
+    def test_matches_apply_json_mask(self):
+        for mask, is_negated in itertools.product(MASKS, (False, True,)):
+            structure = parse_fields(mask) if mask else {}
+            expected = [apply_json_mask(row, structure, is_negated) for row in self.rows]
+            message = '%s (is_negated=%s)' % (mask, is_negated,)
+            masker = compile_mask(structure, is_negated)
+
+            self.assertEqual(list(masker.iter_rows(self.rows)), expected, message)
+            self.assertEqual(
+                list(masker.iter_rows(copy.deepcopy(self.rows), in_place=True)),
+                expected, message,
+            )
+
+    def test_lazy(self):
+        def rows():
+            yield {'a': 1, 'b': 2}
+            raise AssertionError('Consumed too far')
+
+        masked = compile_mask(parse_fields('a')).iter_rows(rows())
+        self.assertEqual(next(masked), {'a': 1})
+
+
+class TestFingerprint(SimpleTestCase):
+
+    def test_canonical(self):
+        self.assertEqual(FrozenMask(parse_fields('b,a/c')).to_text(), 'a(c),b')
+        self.assertEqual(
+            FrozenMask(parse_fields('b,a/c')).fingerprint,
+            FrozenMask(parse_fields('a(c),b')).fingerprint,
+        )
+        self.assertNotEqual(
+            FrozenMask(parse_fields('a/c')).fingerprint,
+            FrozenMask(parse_fields('a,c')).fingerprint,
+        )
+
+
+class TestIterJsonMaskFromRequest(SimpleTestCase):
+
+    def test_mask_checked_eagerly(self):
+        request = RequestFactory().get('/', {'fields': '@missing'})
+        with self.assertRaises(ParseError):
+            iter_json_mask_from_request(iter([]), request)
+
+    def test_rows(self):
+        request = RequestFactory().get('/', {'excludes': 'b'})
+        rows = iter_json_mask_from_request([{'a': 1, 'b': 2}, {'a': 3, 'b': 4}], request)
+        self.assertEqual(list(rows), [{'a': 1}, {'a': 3}])
@@ -0,0 +1,539 @@
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count, Prefetch
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+from rest_framework_jsonmask.cache import get_cache
+from rest_framework_jsonmask.decorators import data_annotation
+from rest_framework_jsonmask.planning import get_lookup_path
+
+from . import factories, views
+from .models import Ticket
+
+
+class ViewSetMixin(object):
+
+    def setUp(self):
+        super(ViewSetMixin, self).setUp()
+
+        self.rf = RequestFactory()
+
+        self.ticket = factories.TicketFactory()
+        self.comment = factories.CommentFactory(ticket=self.ticket)
+
+    def get_viewset(self, data=None, viewset_class=views.TicketViewSet):
+        view_instance = viewset_class()
+        view_instance.request = self.rf.get(reverse('ticket-list'), data=data or {})
+        view_instance.request.user = AnonymousUser()
+        view_instance.kwargs = {}
+        view_instance.format_kwarg = 'format'
+        return view_instance
+
+    def get_data(self, view_instance):
+        queryset = view_instance.get_queryset()
+        return queryset, view_instance.get_serializer(queryset, many=True).data
+
+
+class TestColumnPruning(ViewSetMixin, TestCase):
+
+    def test_only_requested_columns(self):
+        view_instance = self.get_viewset({'fields': 'title'})
+        queryset, data = self.get_data(view_instance)
+
+        sql = str(queryset.query)
+        self.assertIn('"title"', sql)
+        self.assertNotIn('"body"', sql)
+        self.assertEqual(data, [{'title': self.ticket.title}])
+
+    def test_no_queries_for_deferred_columns(self):
+        view_instance = self.get_viewset({'fields': 'title,author/username,comments/body'})
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        with self.assertNumQueries(3):
+            data = serializer.data
+
+        self.assertEqual(data, [{
+            'title': self.ticket.title,
+            'author': {'username': self.ticket.author.username},
+            'comments': [{'body': self.comment.body}],
+        }])
+
+    def test_excludes_defer_columns(self):
+        view_instance = self.get_viewset({'excludes': 'body,comments'})
+        queryset, data = self.get_data(view_instance)
+
+        self.assertNotIn('"body"', str(queryset.query))
+        self.assertEqual(set(data[0]), {'title', 'author'})
+
+    def test_nested_select_related(self):
+        view_instance = self.get_viewset(
+            {'fields': 'title,author/username'}, views.SelectRelatedTicketViewSet,
+        )
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        sql = str(queryset.query)
+        self.assertIn('"username"', sql)
+        self.assertNotIn('"email"', sql)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(serializer.data, [{
+                'title': self.ticket.title,
+                'author': {'username': self.ticket.author.username},
+            }])
+
+    def test_nested_select_related_excludes(self):
+        view_instance = self.get_viewset(
+            {'excludes': 'comments,author/email'}, views.SelectRelatedTicketViewSet,
+        )
+        queryset, data = self.get_data(view_instance)
+
+        sql = str(queryset.query)
+        self.assertIn('"username"', sql)
+        self.assertNotIn('"email"', sql)
+        self.assertEqual(data[0]['author'], {'username': self.ticket.author.username})
+
+    def test_writes_load_every_column(self):
+        modified_at = self.ticket.modified_at
+        view = views.WritableTicketViewSet.as_view({'patch': 'partial_update'})
+        request = APIRequestFactory().patch(
+            reverse('ticket-detail', args=[self.ticket.pk]) + '?fields=title', {'title': 'Renamed'}, format='json',
+        )
+        response = view(request, pk=self.ticket.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'title': 'Renamed'})
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.title, 'Renamed')
+        self.assertGreater(self.ticket.modified_at, modified_at)
+
+    def test_opt_out(self):
+        view_instance = self.get_viewset({'fields': 'title'}, views.UnprunedTicketViewSet)
+        queryset = view_instance.get_queryset()
+
+        self.assertIn('"body"', str(queryset.query))
+
+
+class TestInferredRelations(ViewSetMixin, TestCase):
+
+    def setUp(self):
+        super(TestInferredRelations, self).setUp()
+        factories.CommentFactory(ticket=self.ticket)
+
+    def get_prefetch(self, queryset):
+        prefetch, = queryset._prefetch_related_lookups
+        self.assertIsInstance(prefetch, Prefetch)
+        return prefetch
+
+    def test_no_mask(self):
+        view_instance = self.get_viewset(viewset_class=views.InferredTicketViewSet)
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        self.assertEqual(queryset.query.select_related, {'author': {}})
+        prefetch = self.get_prefetch(queryset)
+        self.assertEqual(prefetch.prefetch_to, 'comments')
+        self.assertEqual(prefetch.queryset.query.select_related, {'author': {}})
+
+        with self.assertNumQueries(2):
+            """
+            1. Load Tickets joined with Authors
+            2. Prefetch Comments joined with Authors
+            """
+            data = serializer.data
+
+        self.assertEqual(len(data[0]['comments']), 2)
+        self.assertEqual(data[0]['author']['username'], self.ticket.author.username)
+        self.assertEqual(data[0]['comments'][0]['author']['username'], self.comment.author.username)
+
+    def test_requested(self):
+        view_instance = self.get_viewset(
+            {'fields': 'title,comments/body'}, views.InferredTicketViewSet,
+        )
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        self.assertFalse(queryset.query.select_related)
+        prefetch = self.get_prefetch(queryset)
+        self.assertFalse(prefetch.queryset.query.select_related)
+        self.assertNotIn('"author_id"', str(prefetch.queryset.query))
+
+        with self.assertNumQueries(2):
+            serializer.data
+
+    def test_nested_narrowing(self):
+        view_instance = self.get_viewset(
+            {'fields': 'comments(author(username))'}, views.InferredTicketViewSet,
+        )
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        prefetch = self.get_prefetch(queryset)
+        sql = str(prefetch.queryset.query)
+        self.assertIn('"username"', sql)
+        self.assertNotIn('"email"', sql)
+        self.assertNotIn('"body"', sql)
+
+        with self.assertNumQueries(2):
+            data = serializer.data
+
+        self.assertEqual(data[0], {
+            'comments': [
+                {'author': {'username': comment.author.username}}
+                for comment in self.ticket.comments.all()
+            ],
+        })
+
+    def test_excluded(self):
+        view_instance = self.get_viewset(
+            {'excludes': 'author,comments/author'}, views.InferredTicketViewSet,
+        )
+        queryset = view_instance.get_queryset()
+
+        self.assertFalse(queryset.query.select_related)
+        prefetch = self.get_prefetch(queryset)
+        self.assertFalse(prefetch.queryset.query.select_related)
+        self.assertNotIn('"author_id"', str(prefetch.queryset.query))
+
+    def test_predicates_override(self):
+        view_instance = self.get_viewset(viewset_class=views.PartiallyInferredTicketViewSet)
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        self.assertEqual(queryset.query.select_related, {'author': {}})
+        self.assertEqual(self.get_prefetch(queryset).prefetch_to, 'comments__author')
+
+        with self.assertNumQueries(3):
+            serializer.data
+
+    def test_fully_covered(self):
+        view_instance = self.get_viewset(viewset_class=views.MaskedPrefetchTicketViewSet)
+        queryset = view_instance.get_queryset()
+
+        self.assertFalse(queryset.query.select_related)
+        self.assertEqual(
+            [get_lookup_path(lookup) for lookup in queryset._prefetch_related_lookups],
+            ['author', 'comments', 'comments__author'],
+        )
+
+    def test_masked_prefetch_in_predicate(self):
+        view_instance = self.get_viewset({'fields': 'comments/body'}, views.MaskedPrefetchTicketViewSet)
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        prefetch = self.get_prefetch(queryset)
+        self.assertNotIn('"author_id"', str(prefetch.queryset.query))
+
+        with self.assertNumQueries(2):
+            serializer.data
+
+    def test_prefetching_queryset(self):
+        for viewset_class in (views.PrefetchingInferredTicketViewSet, views.PrefetchingTicketViewSet):
+            for data in ({}, {'fields': 'comments/body'}, {'fields': 'title,comments(body,author/username)'}):
+                view = viewset_class.as_view({'get': 'list'})
+                response = view(self.rf.get(reverse('ticket-list'), data))
+                self.assertEqual(response.status_code, 200, (viewset_class, data))
+                self.assertEqual(len(response.data[0]['comments']), 2)
+
+    def test_prefetching_queryset_kept(self):
+        view_instance = self.get_viewset(
+            {'fields': 'comments(author/username)'}, views.PrefetchingInferredTicketViewSet,
+        )
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        self.assertEqual(queryset._prefetch_related_lookups, ('comments__author',))
+
+        with self.assertNumQueries(3):
+            data = serializer.data
+
+        self.assertEqual(data[0]['comments'][0]['author'], {'username': self.comment.author.username})
+
+    def test_masked_prefetch_invalid_path(self):
+        view_instance = self.get_viewset()
+
+        with self.assertRaises(ValueError):
+            view_instance.get_masked_prefetch(Ticket.objects.all(), 'title')
+
+
+class TestDataAnnotations(ViewSetMixin, TestCase):
+
+    def test_requested(self):
+        view_instance = self.get_viewset(
+            {'fields': 'title,comment_count'}, views.AnnotatedTicketViewSet,
+        )
+        queryset, data = self.get_data(view_instance)
+
+        sql = str(queryset.query)
+        self.assertIn('COUNT(', sql)
+        self.assertNotIn('"body"', sql)
+        self.assertEqual(data, [{'title': self.ticket.title, 'comment_count': 1}])
+
+    def test_not_requested(self):
+        view_instance = self.get_viewset({'fields': 'title'}, views.AnnotatedTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        self.assertNotIn('COUNT(', str(queryset.query))
+        self.assertEqual(data, [{'title': self.ticket.title}])
+
+    def test_excluded(self):
+        view_instance = self.get_viewset(
+            {'excludes': 'comment_count,comments'}, views.AnnotatedTicketViewSet,
+        )
+        queryset, data = self.get_data(view_instance)
+
+        self.assertNotIn('COUNT(', str(queryset.query))
+        self.assertNotIn('comment_count', data[0])
+
+    def test_not_excluded(self):
+        view_instance = self.get_viewset({'excludes': 'body'}, views.AnnotatedTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        sql = str(queryset.query)
+        self.assertIn('COUNT(', sql)
+        self.assertNotIn('"body"', sql)
+        self.assertEqual(data[0]['comment_count'], 1)
+
+    def test_no_mask(self):
+        view_instance = self.get_viewset(viewset_class=views.AnnotatedTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        self.assertEqual(data[0]['comment_count'], 1)
+
+    def test_nested_field_name(self):
+        with self.assertRaises(ImproperlyConfigured):
+            class InvalidViewSet(views.AnnotatedTicketViewSet):
+
+                @data_annotation('author.ticket_count')
+                def annotate_ticket_count(self):
+                    return Count('author__tickets')
+
+
+class TestDataDependencies(ViewSetMixin, TestCase):
+
+    def setUp(self):
+        super(TestDataDependencies, self).setUp()
+        self.other_comment = factories.CommentFactory(ticket=self.ticket)
+
+    def test_requested(self):
+        view_instance = self.get_viewset(
+            {'fields': 'title,commenters'}, views.CommentersTicketViewSet,
+        )
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        self.assertEqual(
+            [get_lookup_path(lookup) for lookup in queryset._prefetch_related_lookups],
+            ['comments__author'],
+        )
+        self.assertNotIn('"body"', str(queryset.query))
+
+        with self.assertNumQueries(3):
+            """
+            1. Load Tickets
+            2. Prefetch Comments
+            3. Prefetch Comment Authors
+            """
+            data = serializer.data
+
+        self.assertEqual(data[0]['commenters'], sorted([
+            self.comment.author.username, self.other_comment.author.username,
+        ]))
+
+    def test_not_requested(self):
+        view_instance = self.get_viewset({'fields': 'title'}, views.CommentersTicketViewSet)
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        self.assertEqual(list(queryset._prefetch_related_lookups), [])
+
+        calls = []
+        serializer.child.get_commenters = calls.append
+
+        with self.assertNumQueries(1):
+            serializer.data
+
+        self.assertEqual(calls, [])
+
+    def test_excluded(self):
+        view_instance = self.get_viewset(
+            {'excludes': 'commenters,comments'}, views.CommentersTicketViewSet,
+        )
+        queryset = view_instance.get_queryset()
+
+        self.assertEqual(list(queryset._prefetch_related_lookups), [])
+
+    def test_through_planned_prefetch(self):
+        view_instance = self.get_viewset(
+            {'fields': 'comments/body,commenters'}, views.CommentersTicketViewSet,
+        )
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        self.assertEqual(
+            [get_lookup_path(lookup) for lookup in queryset._prefetch_related_lookups],
+            ['comments'],
+        )
+
+        with self.assertNumQueries(2):
+            """
+            1. Load Tickets
+            2. Prefetch Comments, joined to their Authors
+            """
+            data = serializer.data
+
+        self.assertEqual(len(data[0]['comments']), 2)
+        self.assertEqual(len(data[0]['commenters']), 2)
+
+
+class TestDefaultFields(ViewSetMixin, TestCase):
+
+    def test_no_mask(self):
+        view_instance = self.get_viewset(viewset_class=views.DefaultFieldsTicketViewSet)
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        self.assertEqual(list(queryset._prefetch_related_lookups), [])
+        self.assertNotIn('"body"', str(queryset.query))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(serializer.data, [{
+                'title': self.ticket.title,
+                'author': {'username': self.ticket.author.username},
+            }])
+
+    def test_fields(self):
+        view_instance = self.get_viewset({'fields': 'body'}, views.DefaultFieldsTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        self.assertEqual(data, [{'body': self.ticket.body}])
+
+    def test_excludes(self):
+        view_instance = self.get_viewset({'excludes': 'body'}, views.DefaultFieldsTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        self.assertEqual(set(data[0]), {'title', 'author', 'comments'})
+
+    def test_full(self):
+        view_instance = self.get_viewset({'fields': '*'}, views.DefaultFieldsTicketViewSet)
+        queryset = view_instance.get_queryset()
+        serializer = view_instance.get_serializer(queryset, many=True)
+
+        with self.assertNumQueries(2):
+            data = serializer.data
+
+        self.assertEqual(set(data[0]), {'title', 'body', 'author', 'comments'})
+        self.assertEqual(set(data[0]['author']), {'username', 'email'})
+        self.assertEqual(set(data[0]['comments'][0]), {'body', 'author'})
+
+
+class TestFieldPresets(ViewSetMixin, TestCase):
+
+    def test_preset(self):
+        view_instance = self.get_viewset({'fields': '@summary'}, views.PresetTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        self.assertEqual(data, [{
+            'title': self.ticket.title,
+            'author': {'username': self.ticket.author.username},
+        }])
+
+    def test_preset_with_fields(self):
+        view_instance = self.get_viewset({'fields': '@summary,comments/body'}, views.PresetTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        self.assertEqual(data, [{
+            'title': self.ticket.title,
+            'author': {'username': self.ticket.author.username},
+            'comments': [{'body': self.comment.body}],
+        }])
+
+    def test_preset_widened_by_fields(self):
+        view_instance = self.get_viewset({'fields': '@summary,author'}, views.PresetTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        self.assertEqual(set(data[0]['author']), {'username', 'email'})
+
+    def test_inherited_presets(self):
+        view_instance = self.get_viewset({'fields': '@summary'}, views.InheritedPresetTicketViewSet)
+        queryset, data = self.get_data(view_instance)
+
+        self.assertEqual(data, [{
+            'title': self.ticket.title,
+            'author': {'username': self.ticket.author.username},
+        }])
+
+    def test_inherited_serializer_presets(self):
+        view_instance = self.get_viewset(
+            {'fields': '@bodies,@titles'}, views.InheritedSerializerPresetTicketViewSet,
+        )
+        queryset, data = self.get_data(view_instance)
+
+        self.assertEqual(data, [{
+            'title': self.ticket.title,
+            'body': self.ticket.body,
+            'comments': [{'body': self.comment.body}],
+        }])
+
+    def test_unknown_preset(self):
+        view = views.PresetTicketViewSet.as_view({'get': 'list'})
+        response = view(self.rf.get(reverse('ticket-list'), {'fields': '@missing'}))
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestPlanCache(ViewSetMixin, TestCase):
+
+    def setUp(self):
+        super(TestPlanCache, self).setUp()
+        get_cache('REST_FRAMEWORK_JSONMASK_PLAN_CACHE_SIZE', None).clear()
+
+    def test_repeated_mask_skips_serializer(self):
+        self.get_viewset({'fields': 'title,comments/body'}, views.InferredTicketViewSet).get_queryset()
+
+        view_instance = self.get_viewset({'fields': 'title,comments/body'}, views.InferredTicketViewSet)
+        view_instance.get_serializer = None
+        queryset = view_instance.get_queryset()
+
+        self.assertEqual(
+            [get_lookup_path(lookup) for lookup in queryset._prefetch_related_lookups],
+            ['comments'],
+        )
+        info = get_cache('REST_FRAMEWORK_JSONMASK_PLAN_CACHE_SIZE', None).info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_cached_plans_do_not_share_querysets(self):
+        first = self.get_viewset({'fields': 'comments/body'}, views.InferredTicketViewSet).get_queryset()
+        second = self.get_viewset({'fields': 'comments/body'}, views.InferredTicketViewSet).get_queryset()
+
+        self.assertIsNot(
+            first._prefetch_related_lookups[0].queryset,
+            second._prefetch_related_lookups[0].queryset,
+        )
+
+
+class TestLazyPlanning(ViewSetMixin, TestCase):
+
+    def test_no_queries_before_evaluation(self):
+        viewset_classes = (
+            views.TicketViewSet, views.SelectRelatedTicketViewSet, views.InferredTicketViewSet,
+            views.AnnotatedTicketViewSet, views.CommentersTicketViewSet,
+        )
+        masks = ({}, {'fields': 'title,author/username,comments(body,author)'}, {'excludes': 'comments/author'})
+        for viewset_class in viewset_classes:
+            for data in masks:
+                get_cache('REST_FRAMEWORK_JSONMASK_PLAN_CACHE_SIZE', None).clear()
+                view_instance = self.get_viewset(data, viewset_class)
+
+                # Everything up to iterating the queryset is safe to run
+                # without blocking, e.g. from an event loop
+                with self.assertNumQueries(0):
+                    queryset = view_instance.get_queryset()
+                    serializer = view_instance.get_serializer(queryset, many=True)
+                    serializer.child._readable_fields
+
+                self.assertEqual(len(serializer.data), 1)
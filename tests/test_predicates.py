@@ -0,0 +1,82 @@
+from __future__ import unicode_literals
+
+import itertools
+
+from django.db.models import Prefetch
+from django.test import SimpleTestCase, TestCase
+from jsonmask import parse_fields, should_include_variable
+from rest_framework_jsonmask.planning import (
+    PredicateTrie, normalize_prefetch_lookups,
+)
+
+from .models import Comment, Ticket
+
+
+def make_data_function(name):
+    def data_function(self, queryset):
+        return queryset
+    data_function.__name__ = str(name)
+    return data_function
+
+
+PATHS = [
+    'a', 'b', 'c', 'a.b', 'a.c', 'a.b.c', 'b.a', 'b.a.d', 'c.d.e',
+]
+
+MASKS = [
+    'a', 'b', 'a/b', 'a(b,c)', 'a/b/c', 'b(a/d),c', '*', 'a/*', 'a/*/c',
+    'c/d', 'c/d/e', 'a,b,c', 'b/a', 'a/c,b/a/d', 'z', 'a/z', '*/b',
+]
+
+
+class TestPredicateTrie(SimpleTestCase):
+
+    def setUp(self):
+        self.data_predicates = {path: make_data_function(path) for path in PATHS}
+        self.trie = PredicateTrie.build(self.data_predicates)
+
+    def test_matches_should_include_variable(self):
+        for mask, is_negated in itertools.product(MASKS, (False, True,)):
+            structure = parse_fields(mask)
+            expected = set(
+                data_function
+                for path, data_function in self.data_predicates.items()
+                if should_include_variable(path, structure, is_negated=is_negated)
+            )
+            self.assertEqual(
+                set(self.trie.match(structure, is_negated)), expected,
+                '%s (is_negated=%s)' % (mask, is_negated,),
+            )
+
+    def test_parents_first(self):
+        names = [data_function.__name__ for data_function in self.trie.all()]
+        self.assertEqual(names, ['a', 'a.b', 'a.b.c', 'a.c', 'b', 'b.a', 'b.a.d', 'c', 'c.d.e'])
+
+    def test_no_mask_matches_all(self):
+        self.assertEqual(self.trie.match({}), self.trie.all())
+        self.assertEqual(self.trie.match(None, True), self.trie.all())
+
+    def test_function_called_once(self):
+        data_function = make_data_function('shared')
+        trie = PredicateTrie.build({'a': data_function, 'a.b': data_function})
+
+        self.assertEqual(trie.match(parse_fields('a/b')), [data_function])
+
+
+class TestNormalizePrefetchLookups(TestCase):
+
+    def test_subsumed_lookups(self):
+        queryset = Ticket.objects.prefetch_related(
+            'comments', 'author', 'comments__author', 'author',
+        )
+        queryset = normalize_prefetch_lookups(queryset)
+
+        self.assertEqual(list(queryset._prefetch_related_lookups), ['author', 'comments__author'])
+
+    def test_prefetch_objects_kept_first(self):
+        prefetch = Prefetch('comments', queryset=Comment.objects.all())
+        queryset = Ticket.objects.prefetch_related('comments__author', prefetch)
+        queryset = normalize_prefetch_lookups(queryset)
+
+        self.assertEqual(list(queryset._prefetch_related_lookups), [prefetch, 'comments__author'])
+        list(queryset)
@@ -0,0 +1,82 @@
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import AnonymousUser
+from django.db.models.signals import post_init
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from . import factories, views
+
+MASKS = [
+    '',
+    '?fields=title',
+    '?fields=title,author/username',
+    '?fields=comments(body,author/email)',
+    '?excludes=body,comments/author',
+    '?fields=author,comments',
+]
+
+
+class TestJSONProjection(TestCase):
+
+    def setUp(self):
+        self.ticket = factories.TicketFactory()
+        factories.CommentFactory(ticket=self.ticket)
+        factories.CommentFactory(ticket=self.ticket, author=self.ticket.author)
+        factories.TicketFactory(author=None)
+
+        self.instances = []
+        post_init.connect(self.count_instance)
+
+    def tearDown(self):
+        post_init.disconnect(self.count_instance)
+
+    def count_instance(self, sender, instance, **kwargs):
+        self.instances.append(instance)
+
+    def get_json(self, url_name, query=''):
+        resp = self.client.get(reverse(url_name) + query)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_matches_serializer(self):
+        for query in MASKS:
+            self.assertEqual(
+                self.get_json('projected-ticket-list', query),
+                self.get_json('inferred-ticket-list', query),
+                query,
+            )
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            self.get_json('projected-ticket-list', '?fields=title,author/username,comments(author/email)')
+        self.assertEqual(self.instances, [])
+
+    def test_fallback_fields(self):
+        for query in MASKS + ['?fields=title,commenters', '?excludes=author']:
+            self.assertEqual(
+                self.get_json('projected-commenters-ticket-list', query),
+                self.get_json('commenters-ticket-list', query),
+                query,
+            )
+
+    def test_fallback_keeps_needed_prefetches(self):
+        # `commenters` still needs `comments__author` prefetched
+        with self.assertNumQueries(3):
+            self.get_json('projected-commenters-ticket-list', '?fields=title,commenters')
+
+        # Including through the pruned `comments` prefetch
+        with self.assertNumQueries(2):
+            self.get_json('projected-commenters-ticket-list', '?fields=comments/body,commenters')
+
+    def test_fallback_skips_projected_prefetches(self):
+        def get_data(**initkwargs):
+            view = views.AnnotatedTicketViewSet.as_view({'get': 'list'}, **initkwargs)
+            request = RequestFactory().get(reverse('ticket-list'), {'fields': 'title,comments/body,comment_count'})
+            request.user = AnonymousUser()
+            return view(request).data
+
+        # `comment_count` falls back to its annotation, `comments` is projected
+        with self.assertNumQueries(1):
+            data = get_data(json_projection=True)
+        self.assertEqual(data, get_data())
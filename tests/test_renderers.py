@@ -0,0 +1,123 @@
+from __future__ import unicode_literals
+
+import itertools
+import json
+
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+from jsonmask import parse_fields
+from rest_framework.renderers import JSONRenderer
+from rest_framework_jsonmask.maskers import compile_mask
+from rest_framework_jsonmask.renderers import JSONMaskRenderer, mask_data
+
+from . import factories
+
+DATA = [
+    {
+        'a': 1,
+        'b': {'a': 2, 'c': {'d': 3, 'e': [{'f': 4, 'g': 5}]}},
+        'c': [{'a': {'b': True}, 'd': None}, 'text'],
+        'e.f': 5,
+        3: 'three',
+    },
+    {'a': '\u2028', 'b': None, 'c': []},
+]
+
+MASKS = ['', 'a', 'b', 'b/a', 'b(a,c/d)', 'b/c/e/f', 'c/a', '*', '*/a', 'e.f', 'z']
+
+
+class TestJSONMaskRenderer(SimpleTestCase):
+
+    def render(self, query, renderer=None, data=DATA, accepted_media_type='application/json'):
+        request = RequestFactory().get('/', query)
+        return (renderer or JSONMaskRenderer()).render(data, accepted_media_type, {'request': request})
+
+    def test_matches_masked_copy(self):
+        for mask, name in itertools.product(MASKS, ('fields', 'excludes',)):
+            query = {name: mask} if mask else {}
+            expected = DATA
+            if mask:
+                expected = mask_data(DATA, compile_mask(parse_fields(mask), name == 'excludes'))
+            self.assertEqual(self.render(query), JSONRenderer().render(expected), query)
+
+    def test_masks_list_items(self):
+        self.assertEqual(
+            json.loads(self.render({'fields': 'a,b/c/e/f'}).decode('utf-8')),
+            [
+                {'a': 1, 'b': {'c': {'e': [{'f': 4}]}}},
+                {'a': '\u2028', 'b': None},
+            ],
+        )
+
+    def test_escapes_line_separators(self):
+        self.assertIn(b'"\\u2028"', self.render({'fields': 'a'}))
+
+    def test_indent(self):
+        rendered = self.render({'fields': 'a'}, accepted_media_type='application/json; indent=2')
+        self.assertEqual(
+            rendered,
+            JSONRenderer().render([{'a': 1}, {'a': '\u2028'}], 'application/json; indent=2'),
+        )
+
+    def test_custom_dumps(self):
+        encoded = []
+
+        class CountingRenderer(JSONMaskRenderer):
+            def dumps(self, value):
+                encoded.append(value)
+                return super(CountingRenderer, self).dumps(value)
+
+        self.assertEqual(self.render({'fields': 'a,c'}, CountingRenderer()), self.render({'fields': 'a,c'}))
+        # Items whose kept keys need no further masking are encoded whole
+        self.assertEqual(len(encoded), len(DATA))
+
+
+class TestRenderedViews(TestCase):
+
+    def setUp(self):
+        self.ticket = factories.TicketFactory()
+        factories.CommentFactory(ticket=self.ticket, author=self.ticket.author)
+        factories.TicketFactory()
+
+    def get(self, url, query=''):
+        return self.client.get(url + query)
+
+    def test_plain_view(self):
+        resp = self.get(reverse('rendered-raw-data'), '?fields=b/nested,c/b')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), [
+            {'b': {'nested': 'test'}, 'c': [{'b': 2}]},
+            {'b': None, 'c': []},
+        ])
+
+    def test_presets(self):
+        resp = self.get(reverse('rendered-raw-data'), '?fields=@summary')
+        self.assertEqual([sorted(row) for row in resp.json()], [['a', 'b'], ['a', 'b']])
+
+    def test_invalid_mask(self):
+        for query in ('?fields=@unknown', '?fields=a&excludes=b'):
+            resp = self.get(reverse('rendered-raw-data'), query)
+            self.assertEqual(resp.status_code, 400, query)
+            self.assertIn('detail', resp.json())
+
+    def test_paginated_envelope(self):
+        resp = self.get(reverse('rendered-ticket-list'), '?fields=title,author/username&limit=1')
+        data = resp.json()
+        self.assertEqual(data['count'], 2)
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(data['results'], [{
+            'title': self.ticket.title,
+            'author': {'username': self.ticket.author.username},
+        }])
+
+    def test_error_responses_unmasked(self):
+        resp = self.get(reverse('rendered-ticket-detail', args=[0]), '?fields=title')
+        self.assertEqual(resp.status_code, 404)
+        self.assertIn('detail', resp.json())
+
+    def test_optimized_views_unchanged(self):
+        for query in ('?fields=title,comments/body', '?excludes=comments'):
+            self.assertEqual(
+                self.get(reverse('rendered-inferred-ticket-list'), query).content,
+                self.get(reverse('inferred-ticket-list'), query).content,
+            )
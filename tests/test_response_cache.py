@@ -0,0 +1,81 @@
+from __future__ import unicode_literals
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework_jsonmask.response_cache import invalidate_model
+
+from . import factories, views
+from .models import Ticket
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.ticket = factories.TicketFactory()
+        self.comment = factories.CommentFactory(ticket=self.ticket)
+
+    def get(self, query='', url_name='cached-ticket-list', args=None):
+        resp = self.client.get(reverse(url_name, args=args) + query)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_cached(self):
+        query = '?fields=title,comments/author/username'
+        data = self.get(query)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(query), data)
+        self.assertEqual(data, self.get(query, 'inferred-ticket-list'))
+
+    def test_retrieve(self):
+        other = factories.TicketFactory()
+        data = self.get('?fields=title', 'cached-ticket-detail', [self.ticket.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('?fields=title', 'cached-ticket-detail', [self.ticket.pk]), data)
+        self.assertEqual(self.get('?fields=title', 'cached-ticket-detail', [other.pk]), {'title': other.title})
+
+    def test_masks_do_not_collide(self):
+        queries = [
+            '', '?fields=title', '?fields=body', '?excludes=title', '?fields=*',
+            '?fields=author/username', '?fields=author(username)', '?excludes=author/username',
+        ]
+        responses = [self.get(query) for query in queries]
+        for query, data in zip(queries, responses):
+            self.assertEqual(data, self.get(query, 'inferred-ticket-list'), query)
+
+    def test_normalized_key(self):
+        self.get('?fields=body,title&a=1&b=2')
+        with self.assertNumQueries(0):
+            self.get('?b=2&fields=title,body&a=1')
+        with self.assertNumQueries(1):
+            self.get('?fields=title,body&a=2&b=2')
+
+    def test_invalidated(self):
+        query = '?fields=title,comments/author/username'
+        self.get(query)
+
+        def check_invalidated(change):
+            change()
+            with self.assertNumQueries(2):
+                data = self.get(query)
+            self.assertEqual(data, self.get(query, 'inferred-ticket-list'))
+
+        self.ticket.title = 'changed'
+        check_invalidated(self.ticket.save)
+        author = self.comment.author
+        author.username = 'renamed'
+        check_invalidated(author.save)
+        check_invalidated(self.comment.delete)
+        check_invalidated(lambda: invalidate_model(Ticket))
+
+    def test_errors_not_cached(self):
+        for _ in range(2):
+            resp = self.client.get(reverse('cached-ticket-list') + '?fields=@unknown')
+            self.assertEqual(resp.status_code, 400)
+
+    def test_dependencies(self):
+        self.assertEqual(
+            views.CachedTicketViewSet._response_cache_models,
+            ('auth.User', 'tests.Comment', 'tests.Ticket'),
+        )
@@ -0,0 +1,76 @@
+from __future__ import unicode_literals
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework_jsonmask import signals
+from rest_framework_jsonmask.utils import get_mask_cache, parse_mask
+
+from . import factories, views
+from .serializers import CommentSerializer, TicketSerializer
+
+
+class TestSignals(TestCase):
+
+    def setUp(self):
+        ticket = factories.TicketFactory()
+        factories.CommentFactory(ticket=ticket)
+        get_mask_cache().clear()
+        self.sent = []
+
+    def connect(self, signal, sender=None):
+        def receiver(signal, **kwargs):
+            self.sent.append((signal, kwargs))
+        signal.connect(receiver, sender=sender, weak=False)
+        self.addCleanup(signal.disconnect, receiver, sender=sender)
+
+    def get_sent(self, signal):
+        return [kwargs for sent_signal, kwargs in self.sent if sent_signal is signal]
+
+    def test_no_listeners(self):
+        self.assertFalse(signals.has_listeners(signals.mask_parsed))
+        self.connect(signals.queryset_optimized, views.TicketViewSet)
+        self.assertTrue(signals.has_listeners(signals.queryset_optimized, views.TicketViewSet))
+        self.assertFalse(signals.has_listeners(signals.queryset_optimized, views.InferredTicketViewSet))
+
+    def test_mask_parsed(self):
+        self.connect(signals.mask_parsed)
+        parse_mask('title,author')
+        parse_mask('title,author')
+
+        sent = self.get_sent(signals.mask_parsed)
+        self.assertEqual([kwargs['cached'] for kwargs in sent], [False, True])
+        self.assertEqual(sent[0]['fingerprint'], parse_mask('author,title').fingerprint)
+        self.assertGreaterEqual(sent[0]['duration'], 0)
+
+    def test_request(self):
+        for signal in (signals.queryset_optimized, signals.fields_pruned, signals.request_masked):
+            self.connect(signal)
+
+        with self.assertNumQueries(2) as context:
+            resp = self.client.get(reverse('ticket-list') + '?fields=title,comments/body')
+        self.assertEqual(resp.status_code, 200)
+        fingerprint = parse_mask('title,comments/body').fingerprint
+
+        optimized, = self.get_sent(signals.queryset_optimized)
+        self.assertEqual(optimized['fingerprint'], fingerprint)
+        self.assertEqual(optimized['data_functions'], ['load_comments'])
+
+        pruned = dict((kwargs['serializer'].__class__, kwargs) for kwargs in self.get_sent(signals.fields_pruned))
+        self.assertEqual(pruned[TicketSerializer]['kept'], ['title', 'comments'])
+        self.assertEqual(pruned[TicketSerializer]['pruned'], ['body', 'author'])
+        self.assertEqual(pruned[CommentSerializer]['kept'], ['body'])
+        self.assertEqual(pruned[CommentSerializer]['fingerprint'], parse_mask('body').fingerprint)
+
+        masked, = self.get_sent(signals.request_masked)
+        self.assertEqual(masked['fingerprint'], fingerprint)
+        self.assertFalse(masked['is_negated'])
+        self.assertEqual(masked['queries'], len(context.captured_queries))
+        self.assertIs(masked['response'].data, resp.data)
+
+    def test_rejected_mask(self):
+        self.connect(signals.request_masked)
+        resp = self.client.get(reverse('ticket-list') + '?fields=@unknown')
+        self.assertEqual(resp.status_code, 400)
+
+        masked, = self.get_sent(signals.request_masked)
+        self.assertIsNone(masked['fingerprint'])
@@ -0,0 +1,54 @@
+from __future__ import unicode_literals
+
+import json
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from . import factories, views
+
+
+class TestStreamingList(TestCase):
+
+    def setUp(self):
+        self.rf = RequestFactory()
+        for _ in range(5):
+            factories.CommentFactory(ticket=factories.TicketFactory())
+
+    def get_response(self, viewset_class, data=None, **extra):
+        request = self.rf.get(reverse('ticket-list'), data=data or {}, **extra)
+        request.user = AnonymousUser()
+        return viewset_class.as_view({'get': 'list'})(request)
+
+    def test_matches_regular_list(self):
+        for data in ({}, {'fields': 'title,comments/body'}, {'excludes': 'author'}):
+            expected = self.get_response(views.InferredTicketViewSet, data).render()
+            streamed = self.get_response(views.StreamingTicketViewSet, data)
+
+            self.assertIsInstance(streamed, StreamingHttpResponse)
+            self.assertEqual(streamed['Content-Type'], 'application/json')
+            self.assertEqual(
+                json.loads(b''.join(streamed.streaming_content).decode('utf-8')),
+                json.loads(expected.content.decode('utf-8')),
+            )
+
+    def test_prefetches_per_chunk(self):
+        streamed = self.get_response(views.StreamingTicketViewSet, {'fields': 'title,comments/body'})
+
+        # One query for the tickets, plus one comments prefetch per chunk of 2
+        with self.assertNumQueries(4):
+            content = b''.join(streamed.streaming_content)
+        self.assertEqual(len(json.loads(content.decode('utf-8'))), 5)
+
+    def test_empty(self):
+        Ticket = views.StreamingTicketViewSet.queryset.model
+        Ticket.objects.all().delete()
+
+        streamed = self.get_response(views.StreamingTicketViewSet)
+        self.assertEqual(b''.join(streamed.streaming_content), b'[]')
+
+    def test_browsable_api_not_streamed(self):
+        response = self.get_response(views.StreamingTicketViewSet, HTTP_ACCEPT='text/html')
+        self.assertNotIsInstance(response, StreamingHttpResponse)
@@ -0,0 +1,185 @@
+from __future__ import unicode_literals
+
+import copy
+import pickle
+import threading
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from jsonmask import parse_fields
+from rest_framework.exceptions import ParseError
+from rest_framework_jsonmask.cache import LRUCache
+from rest_framework_jsonmask.utils import (
+    FrozenMask, compile_presets, get_mask_cache, measure_mask, merge_masks,
+    parse_mask, split_mask,
+)
+
+from . import factories
+from .serializers import TicketSerializer
+
+
+class TestLRUCache(SimpleTestCase):
+
+    def test_eviction_order(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_stats(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+
+        info = cache.info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.maxsize, 2)
+        self.assertEqual(info.currsize, 1)
+
+    def test_disabled(self):
+        cache = LRUCache(maxsize=0)
+        cache.set('a', 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_threaded_access(self):
+        cache = LRUCache(maxsize=16)
+
+        def work():
+            for i in range(500):
+                cache.set(i % 32, i)
+                cache.get((i + 1) % 32)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(len(cache), 16)
+        self.assertEqual(cache.hits + cache.misses, 8 * 500)
+
+
+class TestFrozenMask(SimpleTestCase):
+
+    def test_matches_parse_fields(self):
+        self.assertEqual(
+            FrozenMask(parse_fields('a,b(c,d/e)')),
+            parse_fields('a,b(c,d/e)'),
+        )
+
+    def test_immutable(self):
+        mask = FrozenMask(parse_fields('a,b/c'))
+        with self.assertRaises(TypeError):
+            mask['z'] = {}
+        with self.assertRaises(TypeError):
+            mask['b'].update({'z': {}})
+
+    def test_hashable(self):
+        self.assertEqual(
+            hash(FrozenMask(parse_fields('a,b/c'))),
+            hash(FrozenMask(parse_fields('b/c,a'))),
+        )
+
+    def test_copyable(self):
+        mask = FrozenMask(parse_fields('a,b/c'))
+        self.assertEqual(copy.deepcopy(mask), mask)
+        self.assertEqual(pickle.loads(pickle.dumps(mask)), mask)
+        self.assertIsInstance(copy.deepcopy(mask)['b'], FrozenMask)
+
+
+class TestParseMask(SimpleTestCase):
+
+    def setUp(self):
+        get_mask_cache().clear()
+
+    def test_empty(self):
+        self.assertIsNone(parse_mask(''))
+        self.assertIsNone(parse_mask(None))
+
+    def test_cached(self):
+        first = parse_mask('a,b/c')
+        second = parse_mask('a,b/c')
+
+        self.assertIs(first, second)
+        self.assertEqual(get_mask_cache().info().hits, 1)
+        self.assertEqual(get_mask_cache().info().misses, 1)
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_CACHE_SIZE=1)
+    def test_size_setting(self):
+        parse_mask('a')
+        parse_mask('b')
+        self.assertEqual(get_mask_cache().info().maxsize, 1)
+        self.assertEqual(len(get_mask_cache()), 1)
+
+
+class TestMeasureMask(SimpleTestCase):
+
+    def test_measure(self):
+        self.assertEqual(measure_mask('a'), (1, 1))
+        self.assertEqual(measure_mask('a,b,c'), (1, 3))
+        self.assertEqual(measure_mask('a/b(c,d/e)'), (4, 5))
+        self.assertEqual(measure_mask('a(b(c)),d/e'), (3, 5))
+
+
+class TestPresets(SimpleTestCase):
+
+    def setUp(self):
+        get_mask_cache().clear()
+        self.presets = compile_presets({'summary': 'a,b/c'})
+
+    def test_split_mask(self):
+        self.assertEqual(split_mask('a,b(c,d),@e'), ['a', 'b(c,d)', '@e'])
+
+    def test_merge_masks(self):
+        self.assertEqual(
+            merge_masks(parse_fields('a,b/c'), parse_fields('b/d,e')),
+            parse_fields('a,b(c,d),e'),
+        )
+        self.assertEqual(merge_masks(parse_fields('b/c'), parse_fields('b')), {'b': {}})
+
+    def test_resolves_preset(self):
+        self.assertEqual(parse_mask('@summary,d', self.presets), parse_fields('a,b/c,d'))
+
+    def test_cached_per_presets(self):
+        other = compile_presets({'summary': 'x'})
+        self.assertEqual(parse_mask('@summary', self.presets), parse_fields('a,b/c'))
+        self.assertEqual(parse_mask('@summary', other), parse_fields('x'))
+
+    def test_unknown_preset(self):
+        with self.assertRaises(ParseError):
+            parse_mask('@missing', self.presets)
+        with self.assertRaises(ParseError):
+            parse_mask('@summary')
+
+
+class TestSharedCache(TestCase):
+
+    def setUp(self):
+        get_mask_cache().clear()
+
+    def test_views_and_raw_data_share_cache(self):
+        factories.TicketFactory()
+
+        self.client.get(reverse('ticket-list') + '?fields=title')
+        self.client.get(reverse('raw-data') + '?fields=title')
+
+        self.assertEqual(get_mask_cache().info().misses, 1)
+        self.assertGreaterEqual(get_mask_cache().info().hits, 1)
+
+    def test_serializer_accepts_raw_mask(self):
+        ticket = factories.TicketFactory()
+        serializer = TicketSerializer(ticket, context={'requested_fields': 'title,author/username'})
+
+        self.assertEqual(serializer.data, {
+            'title': ticket.title,
+            'author': {
+                'username': ticket.author.username,
+            },
+        })
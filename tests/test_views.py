@@ -1,10 +1,13 @@
 from __future__ import unicode_literals
 
 from django.contrib.auth.models import AnonymousUser
+from django.db.models.signals import post_init
 from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from rest_framework_jsonmask.utils import get_mask_cache
 
 from . import factories, views
+from .models import Attachment
 
 
 class DataMixin(object):
@@ -272,3 +275,140 @@ class TestSettings(DataMixin, TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertNotIn('title', resp.json()[0])
         self.assertNotIn('body', resp.json()[0])
+
+
+class TestMaskLimits(DataMixin, TestCase):
+
+    def setUp(self):
+        super(TestMaskLimits, self).setUp()
+        get_mask_cache().clear()
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_MAX_MASK_LENGTH=10)
+    def test_length(self):
+        resp = self.client.get(reverse('ticket-list') + '?fields=title,body,author')
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.get(reverse('raw-data') + '?excludes=a,b,c,d/a/c')
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.get(reverse('ticket-list') + '?fields=title')
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_MAX_MASK_DEPTH=2)
+    def test_depth(self):
+        resp = self.client.get(reverse('ticket-list') + '?fields=comments(author/username)')
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.get(reverse('ticket-list') + '?fields=title,comments/body')
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_MAX_MASK_NODES=3)
+    def test_nodes(self):
+        resp = self.client.get(reverse('ticket-list') + '?fields=title,body,author,comments')
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.get(reverse('ticket-list') + '?fields=title,author/username')
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_MAX_MASK_PREDICATES=2)
+    def test_predicates(self):
+        resp = self.client.get(reverse('ticket-list') + '?fields=author,comments/author')
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.get(reverse('ticket-list') + '?fields=author,comments/body')
+        self.assertEqual(resp.status_code, 200)
+
+        # Requests without a mask are not client-controlled
+        resp = self.client.get(reverse('ticket-list'))
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_MAX_MASK_PREDICATES=1)
+    def test_predicates_default_fields(self):
+        view = views.DefaultFieldsPredicateTicketViewSet.as_view({'get': 'list'})
+
+        resp = view(RequestFactory().get(reverse('ticket-list')))
+        self.assertEqual(resp.status_code, 200)
+
+        resp = view(RequestFactory().get(reverse('ticket-list'), {'fields': 'author,comments'}))
+        self.assertEqual(resp.status_code, 400)
+
+    @override_settings(REST_FRAMEWORK_JSONMASK_MAX_MASK_PREDICATES=1)
+    def test_predicates_count_inferred_prefetches(self):
+        view = views.PartiallyInferredTicketViewSet.as_view({'get': 'list'})
+
+        # `load_comments`, and a prefetch of their authors
+        resp = view(RequestFactory().get(reverse('ticket-list'), {'fields': 'comments'}))
+        self.assertEqual(resp.status_code, 400)
+
+        resp = view(RequestFactory().get(reverse('ticket-list'), {'fields': 'comments/body'}))
+        self.assertEqual(resp.status_code, 200)
+
+        # A single prefetch, of comments joined with their authors
+        resp = self.client.get(reverse('inferred-ticket-list') + '?fields=comments(body,author/username)')
+        self.assertEqual(resp.status_code, 200)
+
+
+class TestValuesFastPath(DataMixin, TestCase):
+
+    def setUp(self):
+        super(TestValuesFastPath, self).setUp()
+        self.instances = []
+        post_init.connect(self.count_instance)
+
+    def tearDown(self):
+        post_init.disconnect(self.count_instance)
+        super(TestValuesFastPath, self).tearDown()
+
+    def count_instance(self, sender, instance, **kwargs):
+        self.instances.append(instance)
+
+    def get_json(self, url_name, query):
+        resp = self.client.get(reverse(url_name) + query)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_plain_columns(self):
+        with self.assertNumQueries(1):
+            data = self.get_json('inferred-ticket-list', '?fields=title,body')
+
+        self.assertEqual(self.instances, [])
+        self.assertEqual(data, self.get_json('no-values-ticket-list', '?fields=title,body'))
+        self.assertEqual(data, [
+            {'title': self.t1.title, 'body': self.t1.body},
+            {'title': self.t2.title, 'body': self.t2.body},
+        ])
+
+    def test_excludes(self):
+        data = self.get_json('inferred-ticket-list', '?excludes=author,comments')
+
+        self.assertEqual(self.instances, [])
+        self.assertEqual(data, self.get_json('no-values-ticket-list', '?excludes=author,comments'))
+
+    def test_custom_descriptors_need_instances(self):
+        Attachment.objects.create(name='notes', file='attachments/notes.txt')
+        data = self.get_json('attachment-list', '?fields=name,file')
+
+        self.assertNotEqual(self.instances, [])
+        self.assertEqual(data, [{'name': 'notes', 'file': 'http://testserver/attachments/notes.txt'}])
+
+    def test_cursor_pagination(self):
+        view = views.CursorTicketViewSet.as_view({'get': 'list'})
+        resp = view(RequestFactory().get(reverse('ticket-list'), {'fields': 'title'}))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['results'], [{'title': self.t2.title}])
+        self.assertIsNotNone(resp.data['next'])
+
+    def test_distinct(self):
+        factories.TicketFactory(title=self.t1.title)
+        view = views.DistinctTicketViewSet.as_view({'get': 'list'})
+        resp = view(RequestFactory().get(reverse('ticket-list'), {'fields': 'title'}))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data), 3)
+
+    def test_relations_need_instances(self):
+        data = self.get_json('inferred-ticket-list', '?fields=title,author/username')
+
+        self.assertNotEqual(self.instances, [])
+        self.assertEqual(data, self.get_json('no-values-ticket-list', '?fields=title,author/username'))
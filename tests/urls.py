@@ -8,8 +8,27 @@ from . import views
 router = routers.DefaultRouter(trailing_slash=False)
 
 router.register(r'tickets', views.TicketViewSet)
+router.register(r'inferred-tickets', views.InferredTicketViewSet, base_name='inferred-ticket')
+router.register(r'projected-tickets', views.ProjectedTicketViewSet, base_name='projected-ticket')
+router.register(
+    r'projected-commenters-tickets', views.ProjectedCommentersTicketViewSet,
+    base_name='projected-commenters-ticket',
+)
+router.register(
+    r'commenters-tickets', views.CommentersTicketViewSet, base_name='commenters-ticket',
+)
+router.register(r'rendered-tickets', views.RenderedTicketViewSet, base_name='rendered-ticket')
+router.register(
+    r'rendered-inferred-tickets', views.RenderedInferredTicketViewSet,
+    base_name='rendered-inferred-ticket',
+)
+router.register(r'lazy-tickets', views.LazyTicketViewSet, base_name='lazy-ticket')
+router.register(r'cached-tickets', views.CachedTicketViewSet, base_name='cached-ticket')
+router.register(r'attachments', views.AttachmentViewSet)
+router.register(r'no-values-tickets', views.NoValuesTicketViewSet, base_name='no-values-ticket')
 
 urlpatterns = [
     url(r'^', include(router.urls)),
     url(r'^raw/$', views.RawViewSet.as_view(), name='raw-data'),
+    url(r'^rendered-raw/$', views.RenderedRawView.as_view(), name='rendered-raw-data'),
 ]
@@ -1,14 +1,17 @@
 from __future__ import unicode_literals
 
-from rest_framework import response, views as rest_views, viewsets
-from rest_framework_jsonmask.decorators import data_predicate
+from django.db.models import Count
+from rest_framework import pagination, response, views as rest_views, viewsets
+from rest_framework_jsonmask.decorators import data_annotation, data_predicate
+from rest_framework_jsonmask.renderers import JSONMaskRenderer
 from rest_framework_jsonmask.utils import apply_json_mask_from_request
 from rest_framework_jsonmask.views import OptimizedQuerySetMixin
 
-from .models import Ticket
+from .models import Attachment, Ticket
 
 from .serializers import (  # CommentSerializer,; UserSerializer,
-    TicketSerializer,
+    AnnotatedTicketSerializer, AttachmentSerializer, CommentersTicketSerializer,
+    PresetTicketSerializer, TicketSerializer,
 )
 
 
@@ -51,3 +54,196 @@ class RawViewSet(rest_views.APIView):
         }
         data = apply_json_mask_from_request(data, request)
         return response.Response(data=data)
+
+
+class SelectRelatedTicketViewSet(TicketViewSet):
+
+    @data_predicate('author')
+    def load_author(self, queryset):
+        return queryset.select_related('author')
+
+    @data_predicate('comments')
+    def load_comments(self, queryset):
+        return queryset.prefetch_related('comments')
+
+    @data_predicate('comments.author')
+    def load_comment_authors(self, queryset):
+        return queryset.prefetch_related('comments__author')
+
+
+class MaskedPrefetchTicketViewSet(TicketViewSet):
+
+    @data_predicate('author')
+    def load_author(self, queryset):
+        return queryset.prefetch_related('author')
+
+    @data_predicate('comments')
+    def load_comments(self, queryset):
+        return queryset.prefetch_related(
+            self.get_masked_prefetch(queryset, 'comments')
+        )
+
+    @data_predicate('comments.author')
+    def load_comment_authors(self, queryset):
+        return queryset.prefetch_related('comments__author')
+
+
+class WritableTicketViewSet(OptimizedQuerySetMixin, viewsets.ModelViewSet):
+    queryset = Ticket.objects.all()
+    serializer_class = TicketSerializer
+
+
+class UnprunedTicketViewSet(TicketViewSet):
+    prune_columns = False
+
+
+class InferredTicketViewSet(OptimizedQuerySetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Ticket.objects.all()
+    serializer_class = TicketSerializer
+
+
+class PartiallyInferredTicketViewSet(InferredTicketViewSet):
+
+    @data_predicate('comments')
+    def load_comments(self, queryset):
+        return queryset.prefetch_related('comments')
+
+
+class PrefetchingTicketViewSet(TicketViewSet):
+    queryset = Ticket.objects.prefetch_related('comments')
+
+    @data_predicate('comments')
+    def load_comments(self, queryset):
+        return queryset.prefetch_related(
+            self.get_masked_prefetch(queryset, 'comments')
+        )
+
+
+class PrefetchingInferredTicketViewSet(InferredTicketViewSet):
+    queryset = Ticket.objects.prefetch_related('comments')
+
+
+class AnnotatedTicketViewSet(InferredTicketViewSet):
+    serializer_class = AnnotatedTicketSerializer
+
+    @data_annotation('comment_count')
+    def annotate_comment_count(self):
+        return Count('comments')
+
+
+class CommentersTicketViewSet(InferredTicketViewSet):
+    serializer_class = CommentersTicketSerializer
+
+
+class DefaultFieldsTicketViewSet(InferredTicketViewSet):
+    default_fields = 'title,author/username'
+
+
+class DefaultFieldsPredicateTicketViewSet(InferredTicketViewSet):
+    default_fields = 'title,author,comments'
+
+    @data_predicate('author')
+    def load_author(self, queryset):
+        return queryset.select_related('author')
+
+    @data_predicate('comments')
+    def load_comments(self, queryset):
+        return queryset.prefetch_related('comments')
+
+
+class PresetTicketViewSet(InferredTicketViewSet):
+    field_presets = {
+        'summary': 'title,author/username',
+    }
+
+
+class InheritedPresetTicketViewSet(PresetTicketViewSet):
+    pass
+
+
+class SerializerPresetTicketViewSet(InferredTicketViewSet):
+    serializer_class = PresetTicketSerializer
+
+
+class InheritedSerializerPresetTicketViewSet(SerializerPresetTicketViewSet):
+    field_presets = {
+        'titles': 'title',
+    }
+
+
+class StreamingTicketViewSet(InferredTicketViewSet):
+    stream_list = True
+    stream_chunk_size = 2
+
+
+class NoValuesTicketViewSet(InferredTicketViewSet):
+    values_fast_path = False
+
+
+class CursorPagination(pagination.CursorPagination):
+    ordering = '-created_at'
+    page_size = 1
+
+
+class CursorTicketViewSet(InferredTicketViewSet):
+    pagination_class = CursorPagination
+
+
+class DistinctTicketViewSet(InferredTicketViewSet):
+    queryset = Ticket.objects.distinct()
+
+
+class ProjectedTicketViewSet(InferredTicketViewSet):
+    json_projection = True
+    values_fast_path = False
+
+
+class ProjectedCommentersTicketViewSet(ProjectedTicketViewSet):
+    serializer_class = CommentersTicketSerializer
+
+
+class RenderedRawView(rest_views.APIView):
+    renderer_classes = [JSONMaskRenderer]
+    field_presets = {'summary': 'a,b'}
+
+    def get(self, request, *args, **kwargs):
+        return response.Response(data=[
+            {'a': 'test', 'b': {'nested': 'test', 'other': 1}, 'c': [{'a': 1, 'b': 2}]},
+            {'a': '\u2028', 'b': None, 'c': []},
+        ])
+
+
+class RenderedTicketViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Ticket.objects.order_by('pk')
+    serializer_class = TicketSerializer
+    renderer_classes = [JSONMaskRenderer]
+    pagination_class = pagination.LimitOffsetPagination
+
+
+class RenderedInferredTicketViewSet(InferredTicketViewSet):
+    renderer_classes = [JSONMaskRenderer]
+
+
+class LazyTicketViewSet(OptimizedQuerySetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Ticket.objects.all()
+    serializer_class = CommentersTicketSerializer
+    infer_related = False
+
+    @data_predicate('comments')
+    def load_comments(self, queryset):
+        return queryset.prefetch_related('comments')
+
+    @data_predicate('author')
+    def load_author(self, queryset):
+        # Deliberately loads nothing
+        return queryset
+
+
+class CachedTicketViewSet(InferredTicketViewSet):
+    response_cache_timeout = 60
+    response_cache_alias = 'responses'
+
+
+class AttachmentViewSet(OptimizedQuerySetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Attachment.objects.order_by('pk')
+    serializer_class = AttachmentSerializer